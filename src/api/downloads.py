@@ -0,0 +1,174 @@
+"""Streaming file responses with Range and conditional request support."""
+from __future__ import annotations
+
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+PROFILE_CONTENT_TYPE = "application/x-apple-aspen-config"
+CHUNK_SIZE = 64 * 1024
+
+_UUID_SUFFIX = r"-[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}\.mobileconfig"
+
+
+def find_profile(profile_dir: Path, identifier: str) -> Optional[Path]:
+    """Return the newest ``{identifier}-{UUID}.mobileconfig`` the agent wrote."""
+    if not identifier or "/" in identifier or identifier.startswith("."):
+        return None
+    pattern = re.compile(re.escape(identifier) + _UUID_SUFFIX)
+    newest: Optional[tuple[int, str]] = None
+    try:
+        entries = os.scandir(profile_dir)
+    except FileNotFoundError:
+        return None
+    with entries:
+        for entry in entries:
+            if not pattern.fullmatch(entry.name) or not entry.is_file():
+                continue
+            candidate = (entry.stat().st_mtime_ns, entry.name)
+            if newest is None or candidate > newest:
+                newest = candidate
+    return profile_dir / newest[1] if newest else None
+
+
+def _status(status: HTTPStatus) -> str:
+    return f"{status.value} {status.phrase}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single ``bytes=`` range into ``(start, end)`` inclusive.
+
+    Returns ``None`` when the header should be ignored (malformed or a
+    multi-range request) and raises ``ValueError`` when it is unsatisfiable.
+    """
+    units, _, spec = header.partition("=")
+    first, sep, last = spec.strip().partition("-")
+    if units.strip().lower() != "bytes" or "," in spec or not sep:
+        return None
+    if not (first.isdigit() or (not first and last.isdigit())) or (last and not last.isdigit()):
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("unsatisfiable suffix range")
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and start > end:
+        return None
+    if start >= size:
+        raise ValueError("range starts past end of file")
+    return start, min(end, size - 1)
+
+
+class _FileRange:
+    """Iterates ``length`` bytes of ``handle`` from ``start`` in chunks."""
+
+    def __init__(self, handle: BinaryIO, start: int, length: int) -> None:
+        self.handle = handle
+        self.start = start
+        self.length = length
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.handle.seek(self.start)
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+def serve_file(environ, start_response, path: Path, content_type: str):
+    """Serve ``path`` without buffering it in memory.
+
+    Full responses go through ``wsgi.file_wrapper`` when the server provides
+    one so it can use ``sendfile``; byte ranges are streamed in chunks.
+    Raises ``FileNotFoundError`` if the file disappears before it is opened.
+    """
+    handle = path.open("rb")
+    try:
+        stat = os.fstat(handle.fileno())
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        headers = [
+            ("ETag", etag),
+            ("Last-Modified", formatdate(stat.st_mtime, usegmt=True)),
+            ("Accept-Ranges", "bytes"),
+        ]
+
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        else:
+            not_modified = _not_modified_since(environ.get("HTTP_IF_MODIFIED_SINCE", ""), stat.st_mtime)
+        if not_modified:
+            handle.close()
+            start_response(_status(HTTPStatus.NOT_MODIFIED), headers)
+            return []
+
+        headers.append(("Content-Type", content_type))
+        headers.append(("Content-Disposition", f'attachment; filename="{path.name}"'))
+
+        byte_range = None
+        range_header = environ.get("HTTP_RANGE")
+        if_range = environ.get("HTTP_IF_RANGE")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                handle.close()
+                headers.append(("Content-Range", f"bytes */{size}"))
+                headers.append(("Content-Length", "0"))
+                start_response(_status(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE), headers)
+                return []
+
+        head_only = environ.get("REQUEST_METHOD", "GET").upper() == "HEAD"
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+            headers.append(("Content-Length", str(length)))
+            start_response(_status(HTTPStatus.PARTIAL_CONTENT), headers)
+            if head_only:
+                handle.close()
+                return []
+            return _FileRange(handle, start, length)
+
+        headers.append(("Content-Length", str(size)))
+        start_response(_status(HTTPStatus.OK), headers)
+        if head_only:
+            handle.close()
+            return []
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None:
+            return file_wrapper(handle, CHUNK_SIZE)
+        return _FileRange(handle, 0, size)
+    except BaseException:
+        handle.close()
+        raise
@@ -0,0 +1,271 @@
+"""Aggregation gateway that fans requests out to many API instances."""
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from api.main import make_api_server
+from api.responses import ResponseBody, StartResponse, read_body, respond
+from common.models import SystemPolicy
+from spc_client import ApiError, Client, RetryPolicy
+
+
+def parse_inventory(spec: str) -> Dict[str, str]:
+    """Parse ``name=url`` / ``url`` entries separated by commas or newlines."""
+    hosts: Dict[str, str] = {}
+    for entry in spec.replace("\n", ",").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, url = entry.partition("=")
+        if not sep:
+            url = entry
+            name = urlsplit(url if "://" in url else f"http://{url}").netloc
+        hosts[name.strip()] = url.strip()
+    return hosts
+
+
+def load_inventory(path: Path | str) -> Dict[str, str]:
+    """Load ``{"name": "url"}`` or ``{"hosts": [{"name": ..., "url": ...}]}`` JSON."""
+    with Path(path).open("r", encoding="utf-8") as handle:
+        payload = json.load(handle)
+    if isinstance(payload, dict) and isinstance(payload.get("hosts"), list):
+        return {item["name"]: item["url"] for item in payload["hosts"]}
+    return {str(name): str(url) for name, url in payload.items()}
+
+
+def _host_error(exc: BaseException, write: bool = False) -> Dict[str, Any]:
+    if isinstance(exc, ApiError):
+        error = exc.payload.get("error") if isinstance(exc.payload, dict) else None
+        return {"error": error or "backend_error", "status": exc.status}
+    if write and isinstance(exc, (TimeoutError, ConnectionResetError, http.client.HTTPException)):
+        # The request may already have reached the host, so it may or may
+        # not have been applied.
+        return {"error": "unknown", "detail": str(exc) or type(exc).__name__}
+    if isinstance(exc, TimeoutError):
+        return {"error": "timeout"}
+    if isinstance(exc, OSError):
+        return {"error": "unreachable", "detail": str(exc)}
+    return {"error": "bad_response", "detail": str(exc)}
+
+
+class Gateway:
+    """WSGI app that queries every backend concurrently and merges the answers.
+
+    Each backend gets a small keep-alive ``Client`` pool. Every call has
+    ``timeout`` seconds from when a worker starts it, so a host that does
+    not answer in time is reported as a ``timeout`` (``unknown`` for
+    writes) while the other hosts' results are still returned. At most ``concurrency`` calls
+    run at once (default: one per host). Aggregated ``GET`` responses are
+    cached for ``cache_ttl`` seconds; writes clear the cache.
+    """
+
+    def __init__(
+        self,
+        hosts: Dict[str, str],
+        timeout: float = 5.0,
+        cache_ttl: float = 5.0,
+        concurrency: Optional[int] = None,
+        pool_size: int = 4,
+    ) -> None:
+        self.hosts = dict(hosts)
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        no_retry = RetryPolicy(retries=0)
+        self.clients = {
+            name: Client(url, timeout=timeout, pool_size=pool_size, retry=no_retry)
+            for name, url in self.hosts.items()
+        }
+        workers = concurrency if concurrency else len(self.hosts)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="spc-gateway")
+        self._cache: Dict[Tuple[Any, ...], Tuple[float, Dict[str, Any]]] = {}
+        self._inflight: Dict[Tuple[Any, ...], Future] = {}
+        self._generation = 0
+        self._cache_lock = threading.Lock()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        for client in self.clients.values():
+            client.close()
+
+    def fan_out(
+        self, call: Callable[[Client], Any], hosts: Optional[Iterable[str]] = None, write: bool = False
+    ) -> Dict[str, Any]:
+        """Run ``call`` against each backend and split successes from failures."""
+        names = list(self.clients) if hosts is None else list(hosts)
+        errors: Dict[str, Dict[str, Any]] = {}
+        futures = {}
+        started: Dict[str, float] = {}
+        starting = {name: threading.Event() for name in names}
+
+        def timed(name: str, client: Client) -> Any:
+            started[name] = time.monotonic()
+            starting[name].set()
+            return call(client)
+
+        for name in names:
+            client = self.clients.get(name)
+            if client is None:
+                errors[name] = {"error": "unknown_host"}
+                continue
+            futures[name] = self._executor.submit(timed, name, client)
+        results: Dict[str, Any] = {}
+        for name, future in futures.items():
+            # The deadline runs from when a worker picks the call up, so
+            # time spent queued behind other hosts does not count.
+            starting[name].wait()
+            try:
+                results[name] = future.result(timeout=max(0.0, started[name] + self.timeout - time.monotonic()))
+            except FutureTimeoutError:
+                errors[name] = _host_error(TimeoutError("deadline exceeded"), write)
+            except Exception as exc:
+                errors[name] = _host_error(exc, write)
+        return {
+            "results": {name: results[name] for name in sorted(results)},
+            "errors": {name: errors[name] for name in sorted(errors)},
+        }
+
+    def cached_fan_out(
+        self, key: Tuple[Any, ...], call: Callable[[Client], Any], hosts: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """``fan_out`` for reads: served from the cache, with concurrent misses coalesced."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return dict(entry[1], cached=True)
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = Future()
+                generation = self._generation
+        if not leader:
+            return dict(pending.result(), cached=False)
+
+        try:
+            payload = self.fan_out(call, hosts)
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        finally:
+            with self._cache_lock:
+                if self._inflight.get(key) is pending:
+                    del self._inflight[key]
+        pending.set_result(payload)
+
+        if self.cache_ttl > 0:
+            with self._cache_lock:
+                # A write during the fan-out may have made this payload stale.
+                if generation == self._generation:
+                    now = time.monotonic()
+                    expired = [name for name, (expires, _) in self._cache.items() if expires <= now]
+                    for name in expired:
+                        del self._cache[name]
+                    self._cache[key] = (now + self.cache_ttl, payload)
+        return dict(payload, cached=False)
+
+    def invalidate(self) -> None:
+        with self._cache_lock:
+            self._generation += 1
+            self._cache.clear()
+            self._inflight.clear()
+
+    def __call__(self, environ, start_response: StartResponse) -> ResponseBody:
+        path = environ.get("PATH_INFO", "/")
+        method = environ.get("REQUEST_METHOD", "GET").upper()
+        params = {key: values[-1] for key, values in parse_qs(environ.get("QUERY_STRING", "")).items()}
+        selected = params.pop("hosts", None)
+        hosts = sorted(name for name in selected.split(",") if name) if selected else None
+
+        if path == "/healthz" and method == "GET":
+            return respond(start_response, HTTPStatus.OK, {"status": "ok", "hosts": len(self.hosts)})
+
+        if path == "/hosts" and method == "GET":
+            return respond(start_response, HTTPStatus.OK, {"hosts": self.hosts})
+
+        if path == "/fleet/policy" and method == "GET":
+            payload = self.cached_fan_out(
+                ("policy", tuple(hosts or ())), lambda client: client.get_policy().to_dict(), hosts
+            )
+            return self._aggregate(start_response, payload)
+
+        if path == "/fleet/policies" and method == "GET":
+            key = ("policies", tuple(hosts or ()), tuple(sorted(params.items())))
+            payload = self.cached_fan_out(key, lambda client: client.list_policies_page(**params), hosts)
+            return self._aggregate(start_response, payload)
+
+        if path == "/fleet/policy" and method in ("POST", "PUT"):
+            body = read_body(environ)
+            if not isinstance(body, dict):
+                return respond(
+                    start_response,
+                    HTTPStatus.BAD_REQUEST,
+                    {"error": "invalid_policy", "detail": "body must be an object"},
+                )
+            targets = body.pop("hosts", None)
+            if targets is not None and (
+                not isinstance(targets, list) or not all(isinstance(name, str) for name in targets)
+            ):
+                return respond(
+                    start_response,
+                    HTTPStatus.BAD_REQUEST,
+                    {"error": "invalid_hosts", "detail": "hosts must be a list of host names"},
+                )
+            if targets is None:
+                targets = hosts
+            install = bool(body.pop("install", True))
+            policy = SystemPolicy.from_dict(body)
+
+            def apply(client: Client) -> Dict[str, Any]:
+                if method == "POST":
+                    return client.create_policy(policy, install).to_dict()
+                return client.update_policy(policy, install).to_dict()
+
+            payload = self.fan_out(apply, targets, write=True)
+            self.invalidate()
+            return self._aggregate(start_response, payload)
+
+        return respond(start_response, HTTPStatus.NOT_FOUND, {"error": "not_found"})
+
+    def _aggregate(self, start_response: StartResponse, payload: Dict[str, Any]) -> ResponseBody:
+        # Partial results are still a success; only a fleet-wide failure is not.
+        status = HTTPStatus.BAD_GATEWAY if payload["errors"] and not payload["results"] else HTTPStatus.OK
+        return respond(start_response, status, payload)
+
+
+def gateway_from_env() -> Gateway:
+    inventory_path = os.environ.get("SPC_GATEWAY_INVENTORY")
+    if inventory_path:
+        hosts = load_inventory(inventory_path)
+    else:
+        hosts = parse_inventory(os.environ.get("SPC_GATEWAY_HOSTS", ""))
+    return Gateway(
+        hosts,
+        timeout=float(os.environ.get("SPC_GATEWAY_TIMEOUT", "5")),
+        cache_ttl=float(os.environ.get("SPC_GATEWAY_CACHE_TTL", "5")),
+        concurrency=int(os.environ.get("SPC_GATEWAY_CONCURRENCY") or 0) or None,
+    )
+
+
+def run_gateway(host: str = "127.0.0.1", port: int = 8100) -> None:
+    gateway = gateway_from_env()
+    try:
+        with make_api_server(host, port, gateway) as httpd:
+            print(f"SystemPolicyControl gateway for {len(gateway.hosts)} hosts running on http://{host}:{port}")
+            httpd.serve_forever()
+    finally:
+        gateway.close()
+
+
+if __name__ == "__main__":
+    host = os.environ.get("SPC_GATEWAY_HOST", "127.0.0.1")
+    port = int(os.environ.get("SPC_GATEWAY_PORT", "8100"))
+    run_gateway(host, port)
@@ -4,37 +4,26 @@ from __future__ import annotations
 import json
 import os
 import subprocess
+import threading
 from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
 from pathlib import Path
-from typing import Callable
-from wsgiref.simple_server import make_server
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer, make_server
 
+from api import tracing
+from api.downloads import PROFILE_CONTENT_TYPE, find_profile, serve_file
+from api.policy_index import QueryError, index_for_output, parse_query
+from api.reconciler import Reconciler, state_store_desired
+from api.responses import ResponseBody, StartResponse, json_response, read_body, respond
 from common.models import SystemPolicy
 from common.state import PolicyStateStore
+from common.templates import PolicyTemplate, TemplateError, TemplateStore
 
 AGENT_BIN = Path(os.environ.get("SPC_AGENT_PATH", "bin/system-policy-agent"))
 STATE_PATH = Path(os.environ.get("SPC_STATE_PATH", "data/policy_state.json"))
 PROFILE_DIR = Path(os.environ.get("SPC_PROFILE_DIR", "data/profiles"))
-
-ResponseBody = list[bytes]
-StartResponse = Callable[[str, list[tuple[str, str]]], None]
-
-
-def _json_response(status: HTTPStatus, payload: dict) -> tuple[str, list[tuple[str, str]], ResponseBody]:
-    body = json.dumps(payload).encode("utf-8")
-    headers = [
-        ("Content-Type", "application/json"),
-        ("Content-Length", str(len(body))),
-    ]
-    return f"{status.value} {status.phrase}", headers, [body]
-
-
-def _read_body(environ) -> dict:
-    length = int(environ.get("CONTENT_LENGTH") or 0)
-    raw = environ["wsgi.input"].read(length) if length else b""
-    if not raw:
-        return {}
-    return json.loads(raw.decode("utf-8"))
+TEMPLATE_PATH = Path(os.environ.get("SPC_TEMPLATE_PATH", "data/policy_templates.json"))
 
 
 def _agent_args(
@@ -85,10 +74,97 @@ def _list_args(agent_bin: Path) -> list[str]:
     return args
 
 
+# Template registries outlive a single request so resolutions stay memoized.
+_template_stores: dict[Path, TemplateStore] = {}
+
+
+def _template_store(path: Path) -> TemplateStore:
+    store = _template_stores.get(path)
+    if store is None:
+        store = _template_stores.setdefault(path, TemplateStore(path))
+    return store
+
+
+# Every agent run that writes the single state file, together with the
+# store.load() reading its result, holds this lock: the threaded server would
+# otherwise read half-written state or another request's policy.
+_agent_lock = threading.Lock()
+
+
+def _run_agent(args: list[str]) -> subprocess.CompletedProcess:
+    with tracing.span("agent", action=args[1]):
+        return subprocess.run(args, capture_output=True, text=True, env=tracing.agent_env())
+
+
+def _list_profiles(agent_bin: Path) -> list[dict]:
+    result = _run_agent(_list_args(agent_bin))
+    if result.returncode != 0:
+        raise RuntimeError(f"agent list failed: {result.stderr.strip()}")
+    # Garbled output must not read as "nothing installed": the reconciler
+    # would force-install every desired profile.
+    try:
+        profiles = json.loads(result.stdout)
+    except json.JSONDecodeError as exc:
+        raise RuntimeError(f"agent list returned invalid JSON: {exc}") from None
+    if not isinstance(profiles, list):
+        raise RuntimeError("agent list did not return a list")
+    return profiles
+
+
+# Started by run_server when SPC_RECONCILE_INTERVAL is set.
+_reconciler: Reconciler | None = None
+
+
+def build_reconciler() -> Reconciler:
+    agent_bin = Path(os.environ.get("SPC_AGENT_PATH", "bin/system-policy-agent"))
+    state_path = Path(os.environ.get("SPC_STATE_PATH", "data/policy_state.json"))
+    profile_dir = Path(os.environ.get("SPC_PROFILE_DIR", "data/profiles"))
+    interval = float(os.environ.get("SPC_RECONCILE_INTERVAL", "60"))
+    store = PolicyStateStore(state_path)
+
+    def reapply(policy: SystemPolicy) -> bool | None:
+        args = _agent_args(agent_bin, policy, True, profile_dir, state_path)
+        with _agent_lock:
+            # A request may have replaced or removed the policy since the cycle
+            # read the desired state; re-applying would undo it.
+            state = store.load()
+            if state is None or not state.install_attempted or state.policy != policy:
+                return None
+            return _run_agent(args).returncode == 0
+
+    return Reconciler(
+        list_profiles=lambda: _list_profiles(agent_bin),
+        reapply=reapply,
+        desired=state_store_desired(store),
+        interval=interval,
+        max_interval=float(os.environ.get("SPC_RECONCILE_MAX_INTERVAL", str(max(interval, 900.0)))),
+        max_reapply_per_second=float(os.environ.get("SPC_RECONCILE_RATE", "1")),
+    )
+
+
 def application(environ, start_response: StartResponse) -> ResponseBody:
     path = environ.get("PATH_INFO", "/")
     method = environ.get("REQUEST_METHOD", "GET").upper()
 
+    trace = tracing.tracer_from_env().start("application", method=method, path=path)
+    if not trace.sampled:
+        return _dispatch(environ, start_response, path, method)
+
+    statuses: list[str] = []
+
+    def traced_start_response(status, headers, *args):
+        statuses.append(status)
+        return start_response(status, headers, *args)
+
+    token = tracing.activate(trace)
+    try:
+        return _dispatch(environ, traced_start_response, path, method)
+    finally:
+        tracing.deactivate(token)
+        trace.finish(status=statuses[-1] if statuses else None)
+
+
+def _dispatch(environ, start_response: StartResponse, path: str, method: str) -> ResponseBody:
     # Re-read environment variables for each request to support testing
     agent_bin = Path(os.environ.get("SPC_AGENT_PATH", "bin/system-policy-agent"))
     state_path = Path(os.environ.get("SPC_STATE_PATH", "data/policy_state.json"))
@@ -97,62 +173,90 @@ def application(environ, start_response: StartResponse) -> ResponseBody:
     store = PolicyStateStore(state_path)
 
     if path == "/healthz" and method == "GET":
-        status, headers, body = _json_response(HTTPStatus.OK, {"status": "ok"})
+        status, headers, body = json_response(HTTPStatus.OK, {"status": "ok"})
         start_response(status, headers)
         return body
 
     if path == "/policies" and method == "GET":
         if not agent_bin.exists() or not agent_bin.is_file():
-            status, headers, body = _json_response(
+            status, headers, body = json_response(
                 HTTPStatus.SERVICE_UNAVAILABLE,
                 {"error": "agent_binary_missing", "path": str(agent_bin)},
             )
             start_response(status, headers)
             return body
+        try:
+            query = parse_query(environ.get("QUERY_STRING", ""))
+        except QueryError as exc:
+            return respond(start_response, HTTPStatus.BAD_REQUEST, {"error": "invalid_query", "detail": str(exc)})
         args = _list_args(agent_bin)
-        result = subprocess.run(args, capture_output=True, text=True)
+        result = _run_agent(args)
         if result.returncode != 0:
-            status, headers, body = _json_response(
+            status, headers, body = json_response(
                 HTTPStatus.INTERNAL_SERVER_ERROR,
                 {"error": "agent_failed", "stderr": result.stderr},
             )
             start_response(status, headers)
             return body
-        try:
-            policies = json.loads(result.stdout)
-        except json.JSONDecodeError:
-            policies = []
-        status, headers, body = _json_response(HTTPStatus.OK, {"policies": policies})
+        with tracing.span("PolicyIndex.query"):
+            policies, next_cursor = index_for_output(result.stdout).query(**query)
+        status, headers, body = json_response(
+            HTTPStatus.OK, {"policies": policies, "next_cursor": next_cursor}
+        )
         start_response(status, headers)
         return body
 
+    if path == "/policy/profile" or path.startswith("/policy/profile/"):
+        if method not in ("GET", "HEAD"):
+            return respond(start_response, HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method_not_allowed"})
+        identifier = path[len("/policy/profile/"):] if path != "/policy/profile" else None
+        with tracing.span("PolicyStateStore.load"):
+            state = store.load()
+        profile_path = None
+        if state and (identifier is None or identifier == state.policy.profile_identifier):
+            profile_path = Path(state.profile_path)
+        elif identifier is not None:
+            profile_path = find_profile(profile_dir, identifier)
+        if profile_path is not None:
+            try:
+                return serve_file(environ, start_response, profile_path, PROFILE_CONTENT_TYPE)
+            except FileNotFoundError:
+                pass
+        return respond(start_response, HTTPStatus.NOT_FOUND, {"error": "profile_not_found"})
+
     if path == "/policy":
         if method == "GET":
-            state = store.load()
+            with tracing.span("PolicyStateStore.load"):
+                state = store.load()
             if not state:
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.NOT_FOUND, {"error": "policy_not_found"}
                 )
                 start_response(status, headers)
                 return body
-            status, headers, body = _json_response(HTTPStatus.OK, state.to_dict())
+            status, headers, body = json_response(HTTPStatus.OK, state.to_dict())
             start_response(status, headers)
             return body
         if method == "POST":
             if not agent_bin.exists() or not agent_bin.is_file():
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.SERVICE_UNAVAILABLE,
                     {"error": "agent_binary_missing", "path": str(agent_bin)},
                 )
                 start_response(status, headers)
                 return body
-            payload = _read_body(environ)
+            payload = read_body(environ)
             install = bool(payload.pop("install", True))
-            policy = SystemPolicy.from_dict(payload)
+            with tracing.span("SystemPolicy.from_dict"):
+                policy = SystemPolicy.from_dict(payload)
             args = _agent_args(agent_bin, policy, install, profile_dir, state_path)
-            result = subprocess.run(args, capture_output=True, text=True)
+            with _agent_lock:
+                result = _run_agent(args)
+                if result.returncode == 0:
+                    with tracing.span("PolicyStateStore.load"):
+                        state = store.load()
             if result.returncode != 0:
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                     {
                         "error": "agent_failed",
@@ -162,33 +266,37 @@ def application(environ, start_response: StartResponse) -> ResponseBody:
                 )
                 start_response(status, headers)
                 return body
-            state = store.load()
             if not state:
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                     {"error": "state_unavailable"},
                 )
                 start_response(status, headers)
                 return body
-            status, headers, body = _json_response(HTTPStatus.CREATED, state.to_dict())
+            status, headers, body = json_response(HTTPStatus.CREATED, state.to_dict())
             start_response(status, headers)
             return body
 
         if method == "PUT":
             if not agent_bin.exists() or not agent_bin.is_file():
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.SERVICE_UNAVAILABLE,
                     {"error": "agent_binary_missing", "path": str(agent_bin)},
                 )
                 start_response(status, headers)
                 return body
-            payload = _read_body(environ)
+            payload = read_body(environ)
             install = bool(payload.pop("install", True))
-            policy = SystemPolicy.from_dict(payload)
+            with tracing.span("SystemPolicy.from_dict"):
+                policy = SystemPolicy.from_dict(payload)
             args = _agent_args(agent_bin, policy, install, profile_dir, state_path)
-            result = subprocess.run(args, capture_output=True, text=True)
+            with _agent_lock:
+                result = _run_agent(args)
+                if result.returncode == 0:
+                    with tracing.span("PolicyStateStore.load"):
+                        state = store.load()
             if result.returncode != 0:
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                     {
                         "error": "agent_failed",
@@ -198,39 +306,40 @@ def application(environ, start_response: StartResponse) -> ResponseBody:
                 )
                 start_response(status, headers)
                 return body
-            state = store.load()
             if not state:
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                     {"error": "state_unavailable"},
                 )
                 start_response(status, headers)
                 return body
-            status, headers, body = _json_response(HTTPStatus.OK, state.to_dict())
+            status, headers, body = json_response(HTTPStatus.OK, state.to_dict())
             start_response(status, headers)
             return body
 
         if method == "DELETE":
             if not agent_bin.exists() or not agent_bin.is_file():
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.SERVICE_UNAVAILABLE,
                     {"error": "agent_binary_missing", "path": str(agent_bin)},
                 )
                 start_response(status, headers)
                 return body
-            state = store.load()
+            with _agent_lock:
+                with tracing.span("PolicyStateStore.load"):
+                    state = store.load()
+                if state:
+                    args = _remove_args(agent_bin, state.policy.profile_identifier, profile_dir, state_path)
+                    result = _run_agent(args)
             if not state:
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.NOT_FOUND,
                     {"error": "policy_not_found"},
                 )
                 start_response(status, headers)
                 return body
-            identifier = state.policy.profile_identifier
-            args = _remove_args(agent_bin, identifier, profile_dir, state_path)
-            result = subprocess.run(args, capture_output=True, text=True)
             if result.returncode != 0:
-                status, headers, body = _json_response(
+                status, headers, body = json_response(
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                     {
                         "error": "agent_failed",
@@ -240,19 +349,308 @@ def application(environ, start_response: StartResponse) -> ResponseBody:
                 )
                 start_response(status, headers)
                 return body
-            status, headers, body = _json_response(HTTPStatus.OK, {"message": "Policy removed"})
+            status, headers, body = json_response(HTTPStatus.OK, {"message": "Policy removed"})
             start_response(status, headers)
             return body
 
-    status, headers, body = _json_response(HTTPStatus.NOT_FOUND, {"error": "not_found"})
+    if path == "/reconciler" and method == "GET":
+        if _reconciler is None:
+            return respond(start_response, HTTPStatus.OK, {"running": False})
+        payload = _reconciler.stats.to_dict()
+        payload["running"] = _reconciler.running
+        return respond(start_response, HTTPStatus.OK, payload)
+
+    if path == "/templates" or path.startswith("/templates/"):
+        template_path = Path(os.environ.get("SPC_TEMPLATE_PATH", "data/policy_templates.json"))
+        return _handle_templates(
+            environ, start_response, path, method, template_path, agent_bin, profile_dir, store
+        )
+
+    if path.startswith("/identifiers/"):
+        template_path = Path(os.environ.get("SPC_TEMPLATE_PATH", "data/policy_templates.json"))
+        return _handle_identifier_overrides(environ, start_response, path, method, template_path)
+
+    status, headers, body = json_response(HTTPStatus.NOT_FOUND, {"error": "not_found"})
     start_response(status, headers)
     return body
 
 
+def _handle_templates(
+    environ,
+    start_response: StartResponse,
+    path: str,
+    method: str,
+    template_path: Path,
+    agent_bin: Path,
+    profile_dir: Path,
+    store: PolicyStateStore,
+) -> ResponseBody:
+    templates = _template_store(template_path)
+    registry = templates.load()
+    parts = path.strip("/").split("/")
+
+    if len(parts) == 1:
+        if method == "GET":
+            return respond(
+                start_response,
+                HTTPStatus.OK,
+                {"templates": [template.to_dict() for template in registry.templates()]},
+            )
+        return respond(start_response, HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method_not_allowed"})
+
+    name = parts[1]
+    action = parts[2] if len(parts) == 3 else None
+    if not name or len(parts) > 3 or action not in (None, "resolve", "apply"):
+        return respond(start_response, HTTPStatus.NOT_FOUND, {"error": "not_found"})
+
+    if action is None and method == "PUT":
+        payload = read_body(environ)
+        if not isinstance(payload, dict):
+            return respond(
+                start_response,
+                HTTPStatus.BAD_REQUEST,
+                {"error": "invalid_template", "detail": "body must be an object"},
+            )
+        template = PolicyTemplate(name=name, parent=payload.get("parent"), fields=payload.get("fields") or {})
+        try:
+            registry.set_template(template)
+        except TemplateError as exc:
+            return respond(start_response, HTTPStatus.BAD_REQUEST, {"error": "invalid_template", "detail": str(exc)})
+        templates.save()
+        return respond(start_response, HTTPStatus.OK, template.to_dict())
+
+    try:
+        template = registry.get(name)
+    except TemplateError:
+        return respond(start_response, HTTPStatus.NOT_FOUND, {"error": "template_not_found", "name": name})
+
+    if action is None:
+        if method == "GET":
+            payload = template.to_dict()
+            payload["resolved_fields"] = registry.compiled_fields(name)
+            return respond(start_response, HTTPStatus.OK, payload)
+        if method == "DELETE":
+            try:
+                registry.remove_template(name)
+            except TemplateError as exc:
+                return respond(start_response, HTTPStatus.CONFLICT, {"error": "template_in_use", "detail": str(exc)})
+            templates.save()
+            return respond(start_response, HTTPStatus.OK, {"message": "Template removed"})
+        return respond(start_response, HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method_not_allowed"})
+
+    if method != "POST":
+        return respond(start_response, HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method_not_allowed"})
+    payload = read_body(environ)
+    identifiers = payload.get("identifiers") if isinstance(payload, dict) else None
+    if not isinstance(identifiers, list) or not all(isinstance(item, str) for item in identifiers):
+        return respond(start_response, HTTPStatus.BAD_REQUEST, {"error": "identifiers_required"})
+    policies = registry.resolve_many(name, identifiers)
+
+    if action == "resolve":
+        return respond(start_response, HTTPStatus.OK, {"policies": [policy.to_dict() for policy in policies]})
+
+    if not agent_bin.exists() or not agent_bin.is_file():
+        return respond(
+            start_response,
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            {"error": "agent_binary_missing", "path": str(agent_bin)},
+        )
+    install = bool(payload.get("install", True))
+    results = []
+    for policy in policies:
+        args = _agent_args(agent_bin, policy, install, profile_dir, store.path)
+        with _agent_lock:
+            result = _run_agent(args)
+            if result.returncode == 0:
+                with tracing.span("PolicyStateStore.load"):
+                    state = store.load()
+        if result.returncode != 0:
+            results.append(
+                {
+                    "profile_identifier": policy.profile_identifier,
+                    "status": "failed",
+                    "stdout": result.stdout,
+                    "stderr": result.stderr,
+                }
+            )
+            continue
+        results.append(
+            {
+                "profile_identifier": policy.profile_identifier,
+                "status": "applied",
+                "profile_path": state.profile_path if state else None,
+            }
+        )
+    failed = sum(1 for item in results if item["status"] == "failed")
+    status = HTTPStatus.OK if not failed else HTTPStatus.INTERNAL_SERVER_ERROR
+    return respond(start_response, status, {"results": results, "failed": failed})
+
+
+def _handle_identifier_overrides(
+    environ, start_response: StartResponse, path: str, method: str, template_path: Path
+) -> ResponseBody:
+    parts = path.strip("/").split("/")
+    if len(parts) != 2 or not parts[1]:
+        return respond(start_response, HTTPStatus.NOT_FOUND, {"error": "not_found"})
+    identifier = parts[1]
+    templates = _template_store(template_path)
+    registry = templates.load()
+
+    if method == "GET":
+        fields = registry.identifier_overrides(identifier)
+        if fields is None:
+            return respond(start_response, HTTPStatus.NOT_FOUND, {"error": "overrides_not_found"})
+        return respond(start_response, HTTPStatus.OK, {"identifier": identifier, "fields": fields})
+    if method == "PUT":
+        payload = read_body(environ)
+        if not isinstance(payload, dict):
+            return respond(
+                start_response,
+                HTTPStatus.BAD_REQUEST,
+                {"error": "invalid_overrides", "detail": "body must be an object"},
+            )
+        fields = payload.get("fields") or {}
+        try:
+            registry.set_identifier_overrides(identifier, fields)
+        except TemplateError as exc:
+            return respond(start_response, HTTPStatus.BAD_REQUEST, {"error": "invalid_overrides", "detail": str(exc)})
+        templates.save()
+        return respond(start_response, HTTPStatus.OK, {"identifier": identifier, "fields": fields})
+    if method == "DELETE":
+        registry.remove_identifier_overrides(identifier)
+        templates.save()
+        return respond(start_response, HTTPStatus.OK, {"message": "Overrides removed"})
+    return respond(start_response, HTTPStatus.METHOD_NOT_ALLOWED, {"error": "method_not_allowed"})
+
+
+class _BoundedInput:
+    """Request body reader that never reads past ``Content-Length``."""
+
+    def __init__(self, stream, length: int) -> None:
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.readline(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def drain(self) -> None:
+        while self.remaining and self.read(65536):
+            pass
+
+
+class _KeepAliveServerHandler(ServerHandler):
+    http_version = "1.1"
+
+    def cleanup_headers(self) -> None:
+        super().cleanup_headers()
+        # Without a length the client can only find the end of the body when
+        # the connection closes.
+        if "Content-Length" not in self.headers:
+            self.request_handler.close_connection = True
+        if self.request_handler.close_connection:
+            self.headers["Connection"] = "close"
+
+    def sendfile(self) -> bool:
+        # wsgi.file_wrapper responses (full profile downloads) are copied by
+        # the kernel with socket.sendfile instead of read back in Python.
+        filelike = self.result.filelike
+        length = self.headers.get("Content-Length")
+        try:
+            filelike.fileno()
+        except (AttributeError, OSError):
+            return False
+        if length is None:
+            return False
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        self.bytes_sent = self.request_handler.connection.sendfile(
+            filelike, offset=filelike.tell(), count=int(length)
+        )
+        return True
+
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 handler that serves several requests per connection."""
+
+    protocol_version = "HTTP/1.1"
+    timeout = 30
+    # Headers and body are written separately; avoid Nagle/delayed-ACK stalls
+    # on reused connections.
+    disable_nagle_algorithm = True
+
+    def handle(self) -> None:
+        BaseHTTPRequestHandler.handle(self)
+
+    def handle_one_request(self) -> None:
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except TimeoutError:
+            self.close_connection = True
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ""
+            self.request_version = ""
+            self.command = ""
+            self.send_error(HTTPStatus.REQUEST_URI_TOO_LONG)
+            return
+        if not self.parse_request():
+            return
+        stdin = _BoundedInput(self.rfile, int(self.headers.get("Content-Length") or 0))
+        handler = _KeepAliveServerHandler(
+            stdin, self.wfile, self.get_stderr(), self.get_environ(), multithread=True
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+        stdin.drain()
+
+    def log_request(self, code="-", size="-") -> None:
+        if os.environ.get("SPC_API_QUIET"):
+            return
+        super().log_request(code, size)
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def make_api_server(host: str = "127.0.0.1", port: int = 8000, app=None) -> WSGIServer:
+    """Build the threaded keep-alive WSGI server used by ``run_server``."""
+    return make_server(
+        host,
+        port,
+        app or application,
+        server_class=_ThreadingWSGIServer,
+        handler_class=_KeepAliveRequestHandler,
+    )
+
+
 def run_server(host: str = "127.0.0.1", port: int = 8000) -> None:
-    with make_server(host, port, application) as httpd:
-        print(f"SystemPolicyControl API running on http://{host}:{port}")
-        httpd.serve_forever()
+    global _reconciler
+    if float(os.environ.get("SPC_RECONCILE_INTERVAL") or 0) > 0:
+        _reconciler = build_reconciler()
+        _reconciler.start()
+    try:
+        with make_api_server(host, port) as httpd:
+            print(f"SystemPolicyControl API running on http://{host}:{port}")
+            httpd.serve_forever()
+    finally:
+        if _reconciler is not None:
+            _reconciler.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+"""In-memory index over ``system-policy-agent list`` output for paged queries."""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import parse_qs
+
+MAX_PAGE_SIZE = 1000
+
+
+class QueryError(ValueError):
+    """Raised for malformed pagination cursors or query parameters."""
+
+
+def encode_cursor(identifier: str, position: int) -> str:
+    """Encode the sort key of the last profile on a page.
+
+    ``position`` (the profile's place in the agent output) breaks ties
+    between profiles sharing a ``PayloadIdentifier``, including the ones
+    that have none.
+    """
+    raw = json.dumps([identifier, position], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        raw = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True)
+        identifier, position = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise QueryError("invalid cursor") from None
+    if not isinstance(identifier, str) or not isinstance(position, int) or isinstance(position, bool):
+        raise QueryError("invalid cursor")
+    return identifier, position
+
+
+def parse_query(query_string: str) -> Dict[str, Any]:
+    """Translate a ``/policies`` query string into :meth:`PolicyIndex.query` arguments."""
+    params = parse_qs(query_string)
+
+    def last(name: str) -> Optional[str]:
+        values = params.get(name)
+        return values[-1] if values else None
+
+    limit: Optional[int] = None
+    raw_limit = last("limit")
+    if raw_limit is not None:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise QueryError("limit must be an integer") from None
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise QueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    cursor = last("cursor")
+    if cursor is not None:
+        decode_cursor(cursor)
+    raw_fields = last("fields")
+    return {
+        "limit": limit,
+        "cursor": cursor,
+        "prefix": last("prefix"),
+        "organization": last("organization"),
+        "payload_type": last("payload_type"),
+        "fields": [name for name in raw_fields.split(",") if name] if raw_fields else None,
+    }
+
+
+def _payload_types(profile: Dict[str, Any]) -> set[str]:
+    types = set()
+    if isinstance(profile.get("PayloadType"), str):
+        types.add(profile["PayloadType"])
+    for item in profile.get("PayloadContent") or []:
+        if isinstance(item, dict) and isinstance(item.get("PayloadType"), str):
+            types.add(item["PayloadType"])
+    return types
+
+
+class PolicyIndex:
+    """Profiles sorted by ``PayloadIdentifier`` with organization and type postings.
+
+    Queries walk the sorted order (or the smallest matching posting list)
+    from the cursor and stop once a page is full, so their cost follows the
+    page size rather than the number of installed profiles.
+    """
+
+    def __init__(self, profiles: Iterable[Dict[str, Any]]) -> None:
+        entries = sorted(
+            (
+                (str(profile.get("PayloadIdentifier") or ""), position, profile)
+                for position, profile in enumerate(profiles)
+                if isinstance(profile, dict)
+            ),
+            key=lambda entry: (entry[0], entry[1]),
+        )
+        self.identifiers: List[str] = [entry[0] for entry in entries]
+        self._keys: List[tuple[str, int]] = [(entry[0], entry[1]) for entry in entries]
+        self.profiles: List[Dict[str, Any]] = [entry[2] for entry in entries]
+        self._by_organization: Dict[str, List[int]] = {}
+        self._by_type: Dict[str, List[int]] = {}
+        for position, profile in enumerate(self.profiles):
+            organization = profile.get("PayloadOrganization")
+            if isinstance(organization, str):
+                self._by_organization.setdefault(organization, []).append(position)
+            for payload_type in _payload_types(profile):
+                self._by_type.setdefault(payload_type, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def query(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        prefix: Optional[str] = None,
+        organization: Optional[str] = None,
+        payload_type: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of matching profiles and the cursor for the next page."""
+        start = 0
+        if cursor is not None:
+            start = bisect_right(self._keys, decode_cursor(cursor))
+        if prefix:
+            start = max(start, bisect_left(self.identifiers, prefix))
+
+        postings = []
+        if organization is not None:
+            postings.append(self._by_organization.get(organization, []))
+        if payload_type is not None:
+            postings.append(self._by_type.get(payload_type, []))
+        postings.sort(key=len)
+
+        if postings:
+            driver, others = postings[0], postings[1:]
+            candidates: Iterable[int] = driver[bisect_left(driver, start):]
+        else:
+            others = []
+            candidates = range(start, len(self.profiles))
+
+        page: List[int] = []
+        has_more = False
+        for position in candidates:
+            if prefix and not self.identifiers[position].startswith(prefix):
+                # Identifiers are sorted, so nothing after this can match.
+                break
+            if others and not all(_contains(posting, position) for posting in others):
+                continue
+            if limit is not None and len(page) == limit:
+                has_more = True
+                break
+            page.append(position)
+
+        if fields:
+            results = [
+                {name: self.profiles[position][name] for name in fields if name in self.profiles[position]}
+                for position in page
+            ]
+        else:
+            results = [self.profiles[position] for position in page]
+        next_cursor = encode_cursor(*self._keys[page[-1]]) if has_more and page else None
+        return results, next_cursor
+
+
+def _contains(posting: List[int], position: int) -> bool:
+    index = bisect_left(posting, position)
+    return index < len(posting) and posting[index] == position
+
+
+_cached: tuple[Optional[str], Optional[PolicyIndex]] = (None, None)
+
+
+def index_for_output(stdout: str) -> PolicyIndex:
+    """Parse agent ``list`` output into an index, reusing it while the output is unchanged."""
+    global _cached
+    cached_stdout, cached_index = _cached
+    if cached_index is not None and cached_stdout == stdout:
+        return cached_index
+    try:
+        profiles = json.loads(stdout)
+    except json.JSONDecodeError:
+        profiles = []
+    index = PolicyIndex(profiles if isinstance(profiles, list) else [])
+    _cached = (stdout, index)
+    return index
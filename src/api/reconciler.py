@@ -0,0 +1,285 @@
+"""Background loop that re-applies installed profiles drifting from the desired state."""
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from common.models import SystemPolicy
+from common.state import PolicyStateStore
+
+# Keys the agent writes into the Gatekeeper payload (see buildProfilePayload).
+_CONTENT_KEYS = ("AllowIdentifiedDevelopers", "EnableAssessment", "EnableXProtectMalwareUpload", "PayloadType")
+_DEFAULT_DESCRIPTION = "Generated by SystemPolicyAgent."
+
+ListProfiles = Callable[[], List[Dict[str, Any]]]
+# Returns ``None`` when the policy is no longer desired and was left alone.
+Reapply = Callable[[SystemPolicy], Optional[bool]]
+DesiredState = Callable[[], Mapping[str, SystemPolicy]]
+
+
+def _digest(document: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(document, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def policy_fingerprint(policy: SystemPolicy) -> str:
+    """Fingerprint of the profile the agent generates for ``policy``."""
+    content: Dict[str, Any] = {
+        "EnableAssessment": policy.enable_assessment,
+        "EnableXProtectMalwareUpload": policy.enable_xprotect_malware_upload,
+        "PayloadType": "com.apple.systempolicy.control",
+    }
+    if policy.enable_assessment:
+        content["AllowIdentifiedDevelopers"] = policy.allow_identified_developers
+    return _digest(
+        {
+            "PayloadContent": [content],
+            "PayloadDescription": policy.description or _DEFAULT_DESCRIPTION,
+            "PayloadDisplayName": policy.display_name,
+            "PayloadIdentifier": policy.profile_identifier,
+            "PayloadOrganization": policy.organization,
+        }
+    )
+
+
+def profile_fingerprint(profile: Mapping[str, Any]) -> str:
+    """Fingerprint of an installed profile as reported by ``system-policy-agent list``."""
+    content = [
+        {key: item[key] for key in _CONTENT_KEYS if key in item}
+        for item in profile.get("PayloadContent") or []
+        if isinstance(item, Mapping)
+    ]
+    return _digest(
+        {
+            "PayloadContent": content,
+            "PayloadDescription": profile.get("PayloadDescription"),
+            "PayloadDisplayName": profile.get("PayloadDisplayName"),
+            "PayloadIdentifier": profile.get("PayloadIdentifier"),
+            "PayloadOrganization": profile.get("PayloadOrganization"),
+        }
+    )
+
+
+def state_store_desired(store: PolicyStateStore) -> DesiredState:
+    """Desired state backed by the state file, re-read only when it changes.
+
+    Only policies the agent was asked to install are expected to show up in
+    the installed profile list. The same mapping object is returned until the
+    file changes, which lets the reconciler skip re-fingerprinting it.
+    """
+    cache: Dict[str, Any] = {"mtime_ns": None, "desired": {}}
+
+    def desired() -> Mapping[str, SystemPolicy]:
+        try:
+            mtime_ns = store.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns != cache["mtime_ns"]:
+            state = store.load() if mtime_ns is not None else None
+            if state and state.install_attempted:
+                cache["desired"] = {state.policy.profile_identifier: state.policy}
+            else:
+                cache["desired"] = {}
+            cache["mtime_ns"] = mtime_ns
+        return cache["desired"]
+
+    return desired
+
+
+@dataclass
+class ReconcileStats:
+    cycles: int = 0
+    drift_detected: int = 0
+    reapplied: int = 0
+    reapply_failures: int = 0
+    reapply_skipped: int = 0
+    list_failures: int = 0
+    rate_limited: int = 0
+    last_drift_count: int = 0
+    last_cycle_seconds: float = 0.0
+    last_cycle_at: Optional[float] = None
+    consecutive_failures: int = 0
+    next_delay_seconds: float = 0.0
+    last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class Reconciler:
+    """Periodically diffs installed profiles against the desired state.
+
+    Desired fingerprints are computed once per desired-state change, and
+    installed profiles are only re-fingerprinted when their ``PayloadUUID``
+    changes, so a cycle's work beyond dictionary lookups scales with the
+    number of changed profiles. Re-applies are limited by a token bucket
+    (``max_reapply_per_second`` with a burst of ``reapply_burst``); failures
+    back off exponentially up to ``max_interval`` and every delay is jittered.
+    """
+
+    def __init__(
+        self,
+        list_profiles: ListProfiles,
+        reapply: Reapply,
+        desired: DesiredState,
+        interval: float = 60.0,
+        max_interval: float = 900.0,
+        jitter: float = 0.1,
+        max_reapply_per_second: float = 1.0,
+        reapply_burst: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.list_profiles = list_profiles
+        self.reapply = reapply
+        self.desired = desired
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.jitter = jitter
+        self.max_reapply_per_second = max_reapply_per_second
+        self.reapply_burst = reapply_burst
+        self.clock = clock
+        self.stats = ReconcileStats()
+        self._tokens = float(reapply_burst)
+        self._tokens_at = clock()
+        self._desired_source: Optional[Mapping[str, SystemPolicy]] = None
+        self._desired_fingerprints: Dict[str, str] = {}
+        self._observed: Dict[str, tuple[Any, str]] = {}
+        self._retry_at: Dict[str, tuple[float, int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> List[str]:
+        """Run a single reconcile cycle and return the drifted identifiers."""
+        started = time.perf_counter()
+        self.stats.cycles += 1
+        self.stats.last_cycle_at = time.time()
+        try:
+            desired = self._refresh_desired()
+            profiles = self.list_profiles()
+        except Exception as exc:
+            self.stats.last_error = str(exc)
+            self.stats.list_failures += 1
+            self.stats.consecutive_failures += 1
+            raise
+        finally:
+            self.stats.last_cycle_seconds = time.perf_counter() - started
+
+        observed: Dict[str, tuple[Any, str]] = {}
+        for profile in profiles:
+            identifier = profile.get("PayloadIdentifier")
+            if identifier not in self._desired_fingerprints:
+                continue
+            key = profile.get("PayloadUUID")
+            previous = self._observed.get(identifier)
+            if key is not None and previous is not None and previous[0] == key:
+                observed[identifier] = previous
+            else:
+                observed[identifier] = (key, profile_fingerprint(profile))
+        self._observed = observed
+
+        drifted = [
+            identifier
+            for identifier, fingerprint in self._desired_fingerprints.items()
+            if identifier not in observed or observed[identifier][1] != fingerprint
+        ]
+        self.stats.last_drift_count = len(drifted)
+        self.stats.drift_detected += len(drifted)
+
+        failed = False
+        now = self.clock()
+        for identifier in drifted:
+            retry_at, failures = self._retry_at.get(identifier, (0.0, 0))
+            if now < retry_at:
+                continue
+            if not self._take_token():
+                self.stats.rate_limited += 1
+                continue
+            outcome = self.reapply(desired[identifier])
+            if outcome is None:
+                # The desired state changed since this cycle read it; the next
+                # cycle diffs against the new one.
+                self.stats.reapply_skipped += 1
+            elif outcome:
+                self.stats.reapplied += 1
+                self._retry_at.pop(identifier, None)
+                self._observed.pop(identifier, None)
+            else:
+                failed = True
+                self.stats.last_error = f"reapply failed for {identifier}"
+                self.stats.reapply_failures += 1
+                self._retry_at[identifier] = (now + self._backoff(failures + 1), failures + 1)
+        for identifier in set(self._retry_at) - set(drifted):
+            del self._retry_at[identifier]
+
+        self.stats.consecutive_failures = self.stats.consecutive_failures + 1 if failed else 0
+        self.stats.last_cycle_seconds = time.perf_counter() - started
+        return drifted
+
+    def next_delay(self) -> float:
+        return self._backoff(self.stats.consecutive_failures)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="spc-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # Recorded in stats; the loop backs off and retries.
+                pass
+            delay = self.next_delay()
+            self.stats.next_delay_seconds = delay
+            self._stop.wait(delay)
+
+    def _refresh_desired(self) -> Mapping[str, SystemPolicy]:
+        desired = self.desired()
+        if desired is not self._desired_source:
+            previous = self._desired_source or {}
+            fingerprints: Dict[str, str] = {}
+            for identifier, policy in desired.items():
+                cached = self._desired_fingerprints.get(identifier)
+                if cached is not None and previous.get(identifier) == policy:
+                    fingerprints[identifier] = cached
+                else:
+                    fingerprints[identifier] = policy_fingerprint(policy)
+            self._desired_fingerprints = fingerprints
+            self._desired_source = desired
+        return desired
+
+    def _backoff(self, failures: int) -> float:
+        # Cap the exponent: past ~1024 failures the float product overflows.
+        delay = min(self.max_interval, self.interval * (2 ** min(failures, 32)))
+        if self.jitter:
+            delay *= random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        return delay
+
+    def _take_token(self) -> bool:
+        now = self.clock()
+        self._tokens = min(
+            float(self.reapply_burst),
+            self._tokens + (now - self._tokens_at) * self.max_reapply_per_second,
+        )
+        self._tokens_at = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
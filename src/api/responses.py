@@ -0,0 +1,37 @@
+"""JSON request and response helpers shared by the API and the gateway."""
+from __future__ import annotations
+
+import json
+from http import HTTPStatus
+from typing import Any, Callable
+
+from api import tracing
+
+ResponseBody = list[bytes]
+StartResponse = Callable[[str, list[tuple[str, str]]], None]
+
+
+def json_response(status: HTTPStatus, payload: dict) -> tuple[str, list[tuple[str, str]], ResponseBody]:
+    with tracing.span("json_response"):
+        body = json.dumps(payload).encode("utf-8")
+    headers = [
+        ("Content-Type", "application/json"),
+        ("Content-Length", str(len(body))),
+    ]
+    return f"{status.value} {status.phrase}", headers, [body]
+
+
+def respond(start_response: StartResponse, status: HTTPStatus, payload: dict) -> ResponseBody:
+    status_line, headers, body = json_response(status, payload)
+    start_response(status_line, headers)
+    return body
+
+
+def read_body(environ) -> Any:
+    """Decode the JSON request body; an empty body reads as ``{}``."""
+    with tracing.span("read_body"):
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        raw = environ["wsgi.input"].read(length) if length else b""
+        if not raw:
+            return {}
+        return json.loads(raw.decode("utf-8"))
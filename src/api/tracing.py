@@ -0,0 +1,243 @@
+"""Sampled request tracing exported in Chrome/Perfetto trace-event JSON."""
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+TRACE_ID_ENV = "SPC_TRACE_ID"
+TRACE_PARENT_ENV = "SPC_TRACE_PARENT_ID"
+TRACE_PATH_ENV = "SPC_TRACE_PATH"
+TRACE_SAMPLE_RATE_ENV = "SPC_TRACE_SAMPLE_RATE"
+
+DEFAULT_TRACE_PATH = "data/traces.json"
+
+
+def _now_us() -> int:
+    # Wall-clock microseconds so spans written by the agent process line up.
+    return time.time_ns() // 1000
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+    def set(self, **args: Any) -> None:
+        return None
+
+
+class _NoopTrace:
+    __slots__ = ()
+    sampled = False
+
+    def span(self, name: str, **args: Any) -> _NoopSpan:
+        return _NOOP_SPAN
+
+    def agent_env(self) -> Optional[dict[str, str]]:
+        return None
+
+    def finish(self, **args: Any) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+NOOP_TRACE = _NoopTrace()
+
+
+class Span:
+    """A timed phase of a sampled request, recorded as a complete ("X") event."""
+
+    __slots__ = ("trace", "name", "args", "span_id", "parent_id", "start_us")
+
+    def __init__(self, trace: "Trace", name: str, args: dict[str, Any]) -> None:
+        self.trace = trace
+        self.name = name
+        self.args = args
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id: Optional[str] = None
+        self.start_us = 0
+
+    def __enter__(self) -> "Span":
+        self.parent_id = self.trace._stack[-1] if self.trace._stack else None
+        self.trace._stack.append(self.span_id)
+        self.start_us = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end_us = _now_us()
+        self.trace._stack.pop()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.trace._record(self, end_us)
+
+    def set(self, **args: Any) -> None:
+        self.args.update(args)
+
+
+class Trace:
+    """Span collector for one sampled request; flushed to the tracer on finish."""
+
+    sampled = True
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.tid = threading.get_ident()
+        self._events: list[dict[str, Any]] = []
+        self._stack: list[str] = []
+        self._root = Span(self, name, args)
+        self._root.__enter__()
+
+    def span(self, name: str, **args: Any) -> Span:
+        return Span(self, name, args)
+
+    def agent_env(self) -> Optional[dict[str, str]]:
+        env = os.environ.copy()
+        env[TRACE_ID_ENV] = self.trace_id
+        env[TRACE_PARENT_ENV] = self._stack[-1] if self._stack else self._root.span_id
+        env[TRACE_PATH_ENV] = str(self.tracer.path)
+        return env
+
+    def finish(self, **args: Any) -> None:
+        self._root.set(**args)
+        self._root.__exit__(None, None, None)
+        self.tracer.export(self._events)
+
+    def _record(self, span: Span, end_us: int) -> None:
+        args = dict(span.args)
+        args["trace_id"] = self.trace_id
+        args["span_id"] = span.span_id
+        if span.parent_id:
+            args["parent_id"] = span.parent_id
+        self._events.append(
+            {
+                "name": span.name,
+                "cat": "api",
+                "ph": "X",
+                "ts": span.start_us,
+                "dur": end_us - span.start_us,
+                "pid": os.getpid(),
+                "tid": self.tid,
+                "args": args,
+            }
+        )
+
+
+class Tracer:
+    """Samples requests and appends their spans to a trace-event file.
+
+    The file uses the JSON Array Format without the closing bracket, which
+    Chrome's ``about:tracing`` and Perfetto both accept, so that the API and
+    the agent can append events independently.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, path: Path | str = Path(DEFAULT_TRACE_PATH)) -> None:
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def start(self, name: str, **args: Any) -> Trace | _NoopTrace:
+        if self.sample_rate <= 0.0 or random.random() >= self.sample_rate:
+            return NOOP_TRACE
+        return Trace(self, name, args)
+
+    def export(self, events: list[dict[str, Any]]) -> None:
+        if not events:
+            return
+        data = "".join(json.dumps(event, sort_keys=True) + ",\n" for event in events).encode("utf-8")
+        with self._lock:
+            _create_trace_file(self.path)
+            # One O_APPEND write per batch, so batches from the API and from
+            # concurrent agent processes never overwrite or split each other.
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+
+
+def _create_trace_file(path: Path) -> None:
+    """Create ``path`` holding just the opening ``[`` unless it already exists.
+
+    The header is written to a private file that is then hard-linked into
+    place, so no process can ever append to a trace file lacking it.
+    """
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    staging.write_bytes(b"[\n")
+    try:
+        os.link(staging, path)
+    except FileExistsError:
+        pass
+    finally:
+        staging.unlink()
+
+
+_tracers: dict[tuple[float, str], Tracer] = {}
+_tracers_lock = threading.Lock()
+_current: contextvars.ContextVar[Trace | _NoopTrace] = contextvars.ContextVar(
+    "spc_current_trace", default=NOOP_TRACE
+)
+
+
+def tracer_from_env() -> Tracer:
+    """Return the shared tracer for the current ``SPC_TRACE_*`` settings."""
+    try:
+        sample_rate = float(os.environ.get(TRACE_SAMPLE_RATE_ENV) or 0.0)
+    except ValueError:
+        sample_rate = 0.0
+    path = os.environ.get(TRACE_PATH_ENV, DEFAULT_TRACE_PATH)
+    key = (sample_rate, path)
+    tracer = _tracers.get(key)
+    if tracer is None:
+        with _tracers_lock:
+            tracer = _tracers.setdefault(key, Tracer(sample_rate, path))
+    return tracer
+
+
+def activate(trace: Trace | _NoopTrace) -> contextvars.Token:
+    return _current.set(trace)
+
+
+def deactivate(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current() -> Trace | _NoopTrace:
+    return _current.get()
+
+
+def span(name: str, **args: Any) -> Span | _NoopSpan:
+    """Open a span on the active trace; a shared no-op when unsampled."""
+    return _current.get().span(name, **args)
+
+
+def agent_env() -> Optional[dict[str, str]]:
+    """Environment for agent subprocesses, or ``None`` to inherit unchanged."""
+    return _current.get().agent_env()
+
+
+def read_events(path: Path | str) -> list[dict[str, Any]]:
+    """Parse a trace file written by :class:`Tracer` (or the agent)."""
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if not text:
+        return []
+    text = text.rstrip(",")
+    if not text.endswith("]"):
+        text += "]"
+    return json.loads(text)
@@ -0,0 +1,267 @@
+"""Layered policy templates resolved into concrete ``SystemPolicy`` objects."""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .models import SystemPolicy
+
+# ``profile_identifier`` always comes from the identifier being resolved.
+TEMPLATE_FIELDS = frozenset(SystemPolicy.__dataclass_fields__) - {"profile_identifier"}  # type: ignore[attr-defined]
+
+# Accepted value types per ``SystemPolicy`` annotation.
+_ANNOTATION_TYPES: Dict[str, tuple] = {"bool": (bool,), "str": (str,), "Optional[str]": (str, type(None))}
+_FIELD_TYPES: Dict[str, tuple] = {
+    name: _ANNOTATION_TYPES[str(definition.type)]
+    for name, definition in SystemPolicy.__dataclass_fields__.items()  # type: ignore[attr-defined]
+    if name in TEMPLATE_FIELDS
+}
+
+
+class TemplateError(ValueError):
+    """Raised for unknown templates, inheritance cycles and invalid fields."""
+
+
+@dataclass
+class PolicyTemplate:
+    name: str
+    parent: Optional[str] = None
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "parent": self.parent, "fields": dict(self.fields)}
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, Any]) -> "PolicyTemplate":
+        return cls(
+            name=payload["name"],
+            parent=payload.get("parent"),
+            fields=dict(payload.get("fields") or {}),
+        )
+
+
+def _check_fields(fields: Dict[str, Any], owner: str) -> None:
+    if not isinstance(fields, dict):
+        raise TemplateError(f"{owner}: fields must be an object, not {type(fields).__name__}")
+    unknown = sorted(set(fields) - TEMPLATE_FIELDS)
+    if unknown:
+        raise TemplateError(f"{owner}: unsupported fields {', '.join(unknown)}")
+    for name, value in fields.items():
+        expected = _FIELD_TYPES[name]
+        if not isinstance(value, expected):
+            names = " or ".join("null" if kind is type(None) else kind.__name__ for kind in expected)
+            raise TemplateError(f"{owner}: {name} must be {names}, not {type(value).__name__}")
+
+
+class TemplateRegistry:
+    """Template graph with memoized resolution.
+
+    Layers apply in order: the template chain from its root (global) down to
+    the named template (e.g. an organization), then any per-identifier
+    overrides. Merged template fields and resolved policies are cached and
+    dropped only for the template that changed and its descendants, or for
+    the identifier whose overrides changed.
+
+    Resolved policies are shared between callers and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        templates: Iterable[PolicyTemplate] = (),
+        identifiers: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        self._lock = threading.RLock()
+        self._templates: Dict[str, PolicyTemplate] = {}
+        self._children: Dict[str, set[str]] = {}
+        self._identifiers: Dict[str, Dict[str, Any]] = {}
+        self._compiled: Dict[str, Dict[str, Any]] = {}
+        self._resolved: Dict[str, Dict[str, SystemPolicy]] = {}
+        self.sync(templates, identifiers or {})
+
+    # -- queries -----------------------------------------------------------
+
+    def get(self, name: str) -> PolicyTemplate:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise TemplateError(f"unknown template: {name}") from None
+
+    def templates(self) -> List[PolicyTemplate]:
+        return [self._templates[name] for name in sorted(self._templates)]
+
+    def identifier_overrides(self, identifier: str) -> Optional[Dict[str, Any]]:
+        return self._identifiers.get(identifier)
+
+    def compiled_fields(self, name: str) -> Dict[str, Any]:
+        """Return the merged fields of ``name`` and all of its ancestors."""
+        compiled = self._compiled.get(name)
+        if compiled is not None:
+            return compiled
+        with self._lock:
+            template = self.get(name)
+            merged = dict(self.compiled_fields(template.parent)) if template.parent else {}
+            merged.update(template.fields)
+            self._compiled[name] = merged
+            return merged
+
+    def resolve(self, name: str, identifier: str) -> SystemPolicy:
+        resolved = self._resolved.get(name)
+        if resolved is not None:
+            policy = resolved.get(identifier)
+            if policy is not None:
+                return policy
+        with self._lock:
+            fields = dict(self.compiled_fields(name))
+            fields.update(self._identifiers.get(identifier, {}))
+            fields["profile_identifier"] = identifier
+            policy = SystemPolicy.from_dict(fields)
+            self._resolved.setdefault(name, {})[identifier] = policy
+            return policy
+
+    def resolve_many(self, name: str, identifiers: Iterable[str]) -> List[SystemPolicy]:
+        self.get(name)
+        return [self.resolve(name, identifier) for identifier in identifiers]
+
+    # -- mutations ---------------------------------------------------------
+
+    def set_template(self, template: PolicyTemplate) -> None:
+        with self._lock:
+            templates = dict(self._templates)
+            templates[template.name] = template
+            self._replace_templates(templates)
+
+    def remove_template(self, name: str) -> None:
+        with self._lock:
+            self.get(name)
+            if self._children.get(name):
+                children = ", ".join(sorted(self._children[name]))
+                raise TemplateError(f"template {name} is inherited by {children}")
+            templates = dict(self._templates)
+            del templates[name]
+            self._replace_templates(templates)
+
+    def set_identifier_overrides(self, identifier: str, fields: Dict[str, Any]) -> None:
+        _check_fields(fields, identifier)
+        with self._lock:
+            if self._identifiers.get(identifier) == fields:
+                return
+            self._identifiers[identifier] = dict(fields)
+            self._invalidate_identifier(identifier)
+
+    def remove_identifier_overrides(self, identifier: str) -> None:
+        with self._lock:
+            if self._identifiers.pop(identifier, None) is not None:
+                self._invalidate_identifier(identifier)
+
+    def sync(self, templates: Iterable[PolicyTemplate], identifiers: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the registry contents, invalidating only what changed."""
+        with self._lock:
+            self._replace_templates({template.name: template for template in templates})
+            for identifier, fields in identifiers.items():
+                self.set_identifier_overrides(identifier, fields)
+            for identifier in set(self._identifiers) - set(identifiers):
+                self.remove_identifier_overrides(identifier)
+
+    # -- persistence -------------------------------------------------------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "templates": [template.to_dict() for template in self.templates()],
+            "identifiers": {key: dict(value) for key, value in sorted(self._identifiers.items())},
+        }
+
+    # -- internals ---------------------------------------------------------
+
+    def _replace_templates(self, templates: Dict[str, PolicyTemplate]) -> None:
+        children: Dict[str, set[str]] = {}
+        for template in templates.values():
+            _check_fields(template.fields, template.name)
+            if template.parent is not None and not isinstance(template.parent, str):
+                raise TemplateError(f"{template.name}: parent must be a template name")
+            if template.parent is None:
+                continue
+            if template.parent not in templates:
+                raise TemplateError(f"{template.name}: unknown parent template {template.parent}")
+            children.setdefault(template.parent, set()).add(template.name)
+        for name in templates:
+            seen = {name}
+            parent = templates[name].parent
+            while parent is not None:
+                if parent in seen:
+                    raise TemplateError(f"{name}: inheritance cycle through {parent}")
+                seen.add(parent)
+                parent = templates[parent].parent
+
+        changed = [
+            name
+            for name in set(self._templates) | set(templates)
+            if self._templates.get(name) != templates.get(name)
+        ]
+        old_children = self._children
+        self._templates = templates
+        self._children = children
+        for name in changed:
+            self._invalidate_template(name, old_children)
+
+    def _invalidate_template(self, name: str, old_children: Dict[str, set[str]]) -> None:
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            self._compiled.pop(current, None)
+            self._resolved.pop(current, None)
+            pending.extend(self._children.get(current, ()))
+            pending.extend(old_children.get(current, ()))
+
+    def _invalidate_identifier(self, identifier: str) -> None:
+        for resolved in self._resolved.values():
+            resolved.pop(identifier, None)
+
+
+class TemplateStore:
+    """JSON-backed template registry that reloads when the file changes."""
+
+    def __init__(self, path: Path | str = Path("data/policy_templates.json")) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.registry = TemplateRegistry()
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> TemplateRegistry:
+        with self._lock:
+            try:
+                mtime_ns = self.path.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtime_ns = None
+            if mtime_ns != self._mtime_ns:
+                payload: Dict[str, Any] = {}
+                if mtime_ns is not None:
+                    with self.path.open("r", encoding="utf-8") as handle:
+                        payload = json.load(handle)
+                self.registry.sync(
+                    [PolicyTemplate.from_dict(item) for item in payload.get("templates", [])],
+                    payload.get("identifiers", {}),
+                )
+                self._mtime_ns = mtime_ns
+            return self.registry
+
+    def save(self) -> None:
+        with self._lock:
+            # Serialize before touching the file, then swap it in atomically so
+            # a failure never leaves a truncated template file behind.
+            data = json.dumps(self.registry.to_dict(), indent=2, sort_keys=True)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, staging = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                    handle.write(data)
+                os.replace(staging, self.path)
+            except BaseException:
+                os.unlink(staging)
+                raise
+            self._mtime_ns = self.path.stat().st_mtime_ns
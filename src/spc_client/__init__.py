@@ -0,0 +1,8 @@
+"""Python client for the SystemPolicyControl HTTP API."""
+from __future__ import annotations
+
+from ._base import ApiError, RetryPolicy
+from .aio import AsyncClient
+from .client import Client
+
+__all__ = ["ApiError", "AsyncClient", "Client", "RetryPolicy"]
@@ -0,0 +1,186 @@
+"""Endpoint definitions shared by the sync and asyncio clients."""
+from __future__ import annotations
+
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import quote, urlencode, urlsplit
+
+from common.models import PolicyState, SystemPolicy
+from common.templates import PolicyTemplate
+
+Decoder = Callable[[int, Dict[str, str], bytes], Any]
+
+
+class ApiError(Exception):
+    """Raised for non-2xx responses; ``payload`` holds the decoded JSON body."""
+
+    def __init__(self, status: int, payload: Any) -> None:
+        self.status = status
+        self.payload = payload
+        error = payload.get("error") if isinstance(payload, dict) else None
+        super().__init__(f"{status} {error or payload!r}")
+
+
+@dataclass
+class RetryPolicy:
+    """Retry ``429``/``503`` responses and dropped connections with backoff."""
+
+    retries: int = 3
+    backoff: float = 0.1
+    max_backoff: float = 5.0
+    statuses: frozenset = frozenset({429, 503})
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        base = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return base * random.uniform(0.5, 1.0)
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    body: Optional[bytes] = None
+
+
+def parse_base_url(base_url: str) -> tuple[str, int, str]:
+    parts = urlsplit(base_url if "://" in base_url else f"http://{base_url}")
+    if parts.scheme != "http":
+        raise ValueError(f"unsupported scheme: {parts.scheme}")
+    return parts.hostname or "127.0.0.1", parts.port or 80, parts.path.rstrip("/")
+
+
+def _json(status: int, headers: Dict[str, str], body: bytes) -> Any:
+    try:
+        payload = json.loads(body.decode("utf-8")) if body else {}
+    except ValueError:
+        # Error pages from proxies or the server's own 500 handler are not JSON.
+        if status < 400:
+            raise
+        raise ApiError(status, body.decode("utf-8", "replace")) from None
+    if status >= 400:
+        raise ApiError(status, payload)
+    return payload
+
+
+def _raw(status: int, headers: Dict[str, str], body: bytes) -> bytes:
+    if status >= 400:
+        _json(status, headers, body)
+    return body
+
+
+def _policy_state(status: int, headers: Dict[str, str], body: bytes) -> PolicyState:
+    return PolicyState.from_dict(_json(status, headers, body))
+
+
+def _template(status: int, headers: Dict[str, str], body: bytes) -> PolicyTemplate:
+    return PolicyTemplate.from_dict(_json(status, headers, body))
+
+
+def _templates(status: int, headers: Dict[str, str], body: bytes) -> List[PolicyTemplate]:
+    return [PolicyTemplate.from_dict(item) for item in _json(status, headers, body)["templates"]]
+
+
+def _policies(status: int, headers: Dict[str, str], body: bytes) -> List[SystemPolicy]:
+    return [SystemPolicy.from_dict(item) for item in _json(status, headers, body)["policies"]]
+
+
+def _field(name: str) -> Decoder:
+    return lambda status, headers, body: _json(status, headers, body)[name]
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload).encode("utf-8")
+
+
+def _policies_path(params: Dict[str, Any]) -> str:
+    query = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        query[key] = ",".join(value) if isinstance(value, (list, tuple)) else value
+    return "/policies" + (f"?{urlencode(query)}" if query else "")
+
+
+def _policy_body(policy: SystemPolicy, install: bool) -> bytes:
+    payload = policy.to_dict()
+    payload["install"] = install
+    return _encode(payload)
+
+
+class Endpoints:
+    """One method per API endpoint.
+
+    Subclasses implement ``_call(request, decoder)``; the sync client returns
+    the decoded value and the asyncio client returns an awaitable of it.
+    """
+
+    def _call(self, request: Request, decoder: Decoder) -> Any:
+        raise NotImplementedError
+
+    def health(self):
+        return self._call(Request("GET", "/healthz"), _field("status"))
+
+    def list_policies(self, **params: Any):
+        """Installed profiles as reported by the agent; ``params`` become the query string."""
+        return self._call(Request("GET", _policies_path(params)), _field("policies"))
+
+    def list_policies_page(self, **params: Any):
+        """One page of ``/policies``: ``{"policies": [...], "next_cursor": ...}``."""
+        return self._call(Request("GET", _policies_path(params)), _json)
+
+    def get_policy(self):
+        return self._call(Request("GET", "/policy"), _policy_state)
+
+    def create_policy(self, policy: SystemPolicy, install: bool = True):
+        return self._call(Request("POST", "/policy", _policy_body(policy, install)), _policy_state)
+
+    def update_policy(self, policy: SystemPolicy, install: bool = True):
+        return self._call(Request("PUT", "/policy", _policy_body(policy, install)), _policy_state)
+
+    def delete_policy(self):
+        return self._call(Request("DELETE", "/policy"), _field("message"))
+
+    def download_profile(self, identifier: Optional[str] = None):
+        path = "/policy/profile" + (f"/{quote(identifier, safe='')}" if identifier else "")
+        return self._call(Request("GET", path), _raw)
+
+    def reconciler_status(self):
+        return self._call(Request("GET", "/reconciler"), _json)
+
+    def list_templates(self):
+        return self._call(Request("GET", "/templates"), _templates)
+
+    def get_template(self, name: str):
+        return self._call(Request("GET", f"/templates/{quote(name, safe='')}"), _template)
+
+    def put_template(self, template: PolicyTemplate):
+        body = _encode({"parent": template.parent, "fields": template.fields})
+        return self._call(Request("PUT", f"/templates/{quote(template.name, safe='')}", body), _template)
+
+    def delete_template(self, name: str):
+        return self._call(Request("DELETE", f"/templates/{quote(name, safe='')}"), _field("message"))
+
+    def resolve_template(self, name: str, identifiers: Iterable[str]):
+        body = _encode({"identifiers": list(identifiers)})
+        return self._call(Request("POST", f"/templates/{quote(name, safe='')}/resolve", body), _policies)
+
+    def apply_template(self, name: str, identifiers: Iterable[str], install: bool = True):
+        body = _encode({"identifiers": list(identifiers), "install": install})
+        return self._call(Request("POST", f"/templates/{quote(name, safe='')}/apply", body), _json)
+
+    def get_identifier_overrides(self, identifier: str):
+        return self._call(Request("GET", f"/identifiers/{quote(identifier, safe='')}"), _field("fields"))
+
+    def set_identifier_overrides(self, identifier: str, fields: Dict[str, Any]):
+        body = _encode({"fields": fields})
+        return self._call(Request("PUT", f"/identifiers/{quote(identifier, safe='')}", body), _field("fields"))
+
+    def delete_identifier_overrides(self, identifier: str):
+        return self._call(Request("DELETE", f"/identifiers/{quote(identifier, safe='')}"), _field("message"))
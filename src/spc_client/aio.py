@@ -0,0 +1,200 @@
+"""asyncio client speaking HTTP/1.1 over pooled keep-alive streams."""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar, Union
+
+from common.models import PolicyState, SystemPolicy
+
+from ._base import ApiError, Decoder, Endpoints, Request, RetryPolicy, parse_base_url
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_IDEMPOTENT = frozenset({"GET", "HEAD", "PUT", "DELETE"})
+_Connection = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class _Response:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, keep_alive: bool) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+
+async def _read_response(reader: asyncio.StreamReader, status_line: bytes, method: str) -> _Response:
+    version, status, _ = status_line.decode("latin-1").split(" ", 2)
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().title()] = value.strip()
+
+    keep_alive = version == "HTTP/1.1" and headers.get("Connection", "").lower() != "close"
+    code = int(status)
+    if method == "HEAD" or code in (204, 304) or 100 <= code < 200:
+        body = b""
+    elif "Content-Length" in headers:
+        body = await reader.readexactly(int(headers["Content-Length"]))
+    elif headers.get("Transfer-Encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return _Response(code, headers, body, keep_alive)
+
+
+class AsyncClient(Endpoints):
+    """asyncio SystemPolicyControl API client.
+
+    At most ``pool_size`` connections are open at once; requests beyond
+    that wait for a free connection. Every endpoint method returns a
+    coroutine.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:8000",
+        timeout: float = 30.0,
+        pool_size: int = 8,
+        retry: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.host, self.port, self.prefix = parse_base_url(base_url)
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.pool_size = pool_size
+        self._idle: List[_Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.connections_opened = 0
+
+    async def __aenter__(self) -> "AsyncClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _open(self) -> _Connection:
+        self.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _exchange(self, request: Request) -> _Response:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        head = [
+            f"{request.method} {self.prefix}{request.path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Accept: application/json",
+            f"Content-Length: {len(request.body or b'')}",
+        ]
+        if request.body is not None:
+            head.append("Content-Type: application/json")
+        payload = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (request.body or b"")
+
+        # Only the exchange itself is timed: waiting for a free pooled
+        # connection is not the server being slow.
+        async with self._slots:
+            return await asyncio.wait_for(self._send(payload, request.method), self.timeout)
+
+    async def _send(self, payload: bytes, method: str) -> _Response:
+        while True:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._open()
+            try:
+                try:
+                    writer.write(payload)
+                    await writer.drain()
+                    status_line = await reader.readline()
+                except (ConnectionResetError, BrokenPipeError):
+                    status_line = b""
+                if not status_line:
+                    writer.close()
+                    # Stale pooled connection closed before answering:
+                    # retry on a fresh one for free.
+                    if reused:
+                        continue
+                    raise ConnectionResetError("server closed the connection")
+                response = await _read_response(reader, status_line, method)
+            except BaseException:
+                writer.close()
+                raise
+            if response.keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def _request(self, request: Request, decoder: Decoder) -> Any:
+        attempt = 0
+        while True:
+            try:
+                response = await self._exchange(request)
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                if request.method not in _IDEMPOTENT or attempt >= self.retry.retries:
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if response.status in self.retry.statuses and attempt < self.retry.retries:
+                await asyncio.sleep(self.retry.delay(attempt, response.headers.get("Retry-After")))
+                attempt += 1
+                continue
+            return decoder(response.status, response.headers, response.body)
+
+    def _call(self, request: Request, decoder: Decoder) -> Awaitable[Any]:
+        return self._request(request, decoder)
+
+    async def iter_policies(self, page_size: int = 100, **filters: Any) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every matching profile, following ``next_cursor`` page by page."""
+        cursor = None
+        while True:
+            page = await self.list_policies_page(limit=page_size, cursor=cursor, **filters)
+            for profile in page["policies"]:
+                yield profile
+            cursor = page.get("next_cursor")
+            if cursor is None:
+                return
+
+    async def map(
+        self, func: Callable[[T], Awaitable[R]], items: Iterable[T], concurrency: int = 8
+    ) -> List[Union[R, Exception]]:
+        """Await ``func`` over ``items`` with at most ``concurrency`` in flight.
+
+        Results keep input order; failures are returned in place.
+        """
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(item: T) -> Union[R, Exception]:
+            async with limit:
+                try:
+                    return await func(item)
+                except (ApiError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+                    return exc
+
+        return list(await asyncio.gather(*(run(item) for item in items)))
+
+    async def apply_policies(
+        self, policies: Iterable[SystemPolicy], install: bool = True, concurrency: int = 8
+    ) -> List[Union[PolicyState, Exception]]:
+        return await self.map(lambda policy: self.create_policy(policy, install), policies, concurrency)
@@ -0,0 +1,140 @@
+"""Blocking client with a keep-alive connection pool."""
+from __future__ import annotations
+
+import http.client
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar, Union
+
+from common.models import PolicyState, SystemPolicy
+
+from ._base import ApiError, Decoder, Endpoints, Request, RetryPolicy, parse_base_url
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_RETRYABLE_ERRORS = (ConnectionError, http.client.BadStatusLine, TimeoutError)
+# Raised before any response bytes arrive when the server dropped an idle
+# pooled connection; the request cannot have been processed.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+_IDEMPOTENT = frozenset({"GET", "HEAD", "PUT", "DELETE"})
+
+
+class Client(Endpoints):
+    """Thread-safe SystemPolicyControl API client.
+
+    Up to ``pool_size`` idle connections are kept open and reused across
+    calls and threads.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:8000",
+        timeout: float = 30.0,
+        pool_size: int = 8,
+        retry: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.host, self.port, self.prefix = parse_base_url(base_url)
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _acquire(self) -> tuple[http.client.HTTPConnection, bool]:
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            with self._lock:
+                self.connections_opened += 1
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def _release(self, connection: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _call(self, request: Request, decoder: Decoder) -> Any:
+        headers = {"Accept": "application/json"}
+        if request.body is not None:
+            headers["Content-Type"] = "application/json"
+        attempt = 0
+        while True:
+            connection, reused = self._acquire()
+            try:
+                try:
+                    connection.request(request.method, self.prefix + request.path, request.body, headers)
+                    response = connection.getresponse()
+                except _STALE_CONNECTION_ERRORS:
+                    # A pooled connection the server already closed is retried
+                    # straight away without spending an attempt.
+                    if reused:
+                        connection.close()
+                        continue
+                    raise
+                body = response.read()
+            except _RETRYABLE_ERRORS:
+                connection.close()
+                if request.method not in _IDEMPOTENT or attempt >= self.retry.retries:
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            if response.status in self.retry.statuses and attempt < self.retry.retries:
+                time.sleep(self.retry.delay(attempt, response.getheader("Retry-After")))
+                attempt += 1
+                continue
+            return decoder(response.status, dict(response.getheaders()), body)
+
+    def iter_policies(self, page_size: int = 100, **filters: Any) -> Iterator[Dict[str, Any]]:
+        """Yield every matching profile, following ``next_cursor`` page by page."""
+        cursor = None
+        while True:
+            page = self.list_policies_page(limit=page_size, cursor=cursor, **filters)
+            yield from page["policies"]
+            cursor = page.get("next_cursor")
+            if cursor is None:
+                return
+
+    def map(
+        self, func: Callable[[T], R], items: Iterable[T], concurrency: int = 8
+    ) -> List[Union[R, Exception]]:
+        """Run ``func`` over ``items`` with at most ``concurrency`` in flight.
+
+        Results keep input order; failures are returned in place rather than
+        raised so one bad item does not abort the batch.
+        """
+
+        def run(item: T) -> Union[R, Exception]:
+            try:
+                return func(item)
+            except (ApiError, OSError, http.client.HTTPException) as exc:
+                return exc
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            return list(executor.map(run, items))
+
+    def apply_policies(
+        self, policies: Iterable[SystemPolicy], install: bool = True, concurrency: int = 8
+    ) -> List[Union[PolicyState, Exception]]:
+        return self.map(lambda policy: self.create_policy(policy, install), policies, concurrency)
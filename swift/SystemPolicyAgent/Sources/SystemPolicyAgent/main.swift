@@ -55,6 +55,95 @@ func resolvePath(_ path: String) -> URL {
     return cwd.appendingPathComponent(expanded)
 }
 
+/// Records agent phases as Chrome trace events when the API propagates a trace.
+final class AgentTracer {
+    let traceID: String
+    let parentID: String?
+    let path: URL
+    private var events: [[String: Any]] = []
+
+    init(traceID: String, parentID: String?, path: URL) {
+        self.traceID = traceID
+        self.parentID = parentID
+        self.path = path
+    }
+
+    static func fromEnvironment() -> AgentTracer? {
+        let environment = ProcessInfo.processInfo.environment
+        guard let traceID = environment["SPC_TRACE_ID"], !traceID.isEmpty,
+              let tracePath = environment["SPC_TRACE_PATH"], !tracePath.isEmpty else {
+            return nil
+        }
+        return AgentTracer(traceID: traceID, parentID: environment["SPC_TRACE_PARENT_ID"], path: resolvePath(tracePath))
+    }
+
+    func span<T>(_ name: String, _ body: () throws -> T) rethrows -> T {
+        let start = Date().timeIntervalSince1970
+        defer {
+            let end = Date().timeIntervalSince1970
+            var args: [String: Any] = ["trace_id": traceID]
+            if let parentID = parentID {
+                args["parent_id"] = parentID
+            }
+            events.append([
+                "name": name,
+                "cat": "agent",
+                "ph": "X",
+                "ts": Int64(start * 1_000_000),
+                "dur": Int64((end - start) * 1_000_000),
+                "pid": Int(ProcessInfo.processInfo.processIdentifier),
+                "tid": 0,
+                "args": args
+            ])
+        }
+        return try body()
+    }
+
+    func flush() {
+        guard !events.isEmpty else { return }
+        var output = Data()
+        for event in events {
+            guard let data = try? JSONSerialization.data(withJSONObject: event, options: [.sortedKeys]) else { continue }
+            output.append(data)
+            output.append(Data(",\n".utf8))
+        }
+        events.removeAll()
+        createTraceFile()
+        // The API and other agents append to the same file; a single O_APPEND
+        // write keeps each batch whole and never overwrites theirs.
+        let descriptor = open(path.path, O_WRONLY | O_APPEND | O_CREAT, 0o644)
+        guard descriptor >= 0 else { return }
+        defer { close(descriptor) }
+        output.withUnsafeBytes { buffer in
+            var offset = 0
+            while offset < buffer.count {
+                let written = write(descriptor, buffer.baseAddress! + offset, buffer.count - offset)
+                if written <= 0 { return }
+                offset += written
+            }
+        }
+    }
+
+    private func createTraceFile() {
+        let fileManager = FileManager.default
+        guard !fileManager.fileExists(atPath: path.path) else { return }
+        try? fileManager.createDirectory(at: path.deletingLastPathComponent(), withIntermediateDirectories: true, attributes: nil)
+        // Link a prepared header into place so the file never exists without it.
+        let staging = path.deletingLastPathComponent()
+            .appendingPathComponent(".\(path.lastPathComponent).\(ProcessInfo.processInfo.processIdentifier)")
+        guard fileManager.createFile(atPath: staging.path, contents: Data("[\n".utf8), attributes: nil) else { return }
+        _ = link(staging.path, path.path)
+        unlink(staging.path)
+    }
+}
+
+let tracer = AgentTracer.fromEnvironment()
+
+func traced<T>(_ name: String, _ body: () throws -> T) rethrows -> T {
+    guard let tracer = tracer else { return try body() }
+    return try tracer.span(name, body)
+}
+
 func parseBool(_ value: String) -> Bool? {
     switch value.lowercased() {
     case "true", "1", "yes":
@@ -251,7 +340,7 @@ func writeProfile(_ profile: [String: Any], to directory: URL, identifier: Strin
     let filename = "\(identifier)-\(UUID().uuidString).mobileconfig"
     let destination = directory.appendingPathComponent(filename)
     let data = try PropertyListSerialization.data(fromPropertyList: profile, format: .xml, options: 0)
-    try data.write(to: destination)
+    try data.write(to: destination, options: .atomic)
     return destination
 }
 
@@ -402,19 +491,26 @@ func writeState(config: AgentConfig, profilePath: URL, installResult: InstallRes
     }
 
     let data = try JSONSerialization.data(withJSONObject: state, options: [.prettyPrinted, .sortedKeys])
-    try data.write(to: config.statePath)
+    try data.write(to: config.statePath, options: .atomic)
 }
 
 func runAgent() -> Int32 {
+    defer { tracer?.flush() }
     do {
         let action = try parseArguments()
 
         switch action {
         case .apply(let config):
-            let profile = buildProfilePayload(config: config)
-            let profilePath = try writeProfile(profile, to: config.profileDirectory, identifier: config.profileIdentifier)
-            let installResult = installProfile(at: profilePath, shouldInstall: config.installProfile)
-            try writeState(config: config, profilePath: profilePath, installResult: installResult)
+            let profile = traced("buildProfilePayload") { buildProfilePayload(config: config) }
+            let profilePath = try traced("writeProfile") {
+                try writeProfile(profile, to: config.profileDirectory, identifier: config.profileIdentifier)
+            }
+            let installResult = traced("installProfile") {
+                installProfile(at: profilePath, shouldInstall: config.installProfile)
+            }
+            try traced("writeState") {
+                try writeState(config: config, profilePath: profilePath, installResult: installResult)
+            }
             if installResult.succeeded || !config.installProfile {
                 print("Profile generated at \(profilePath.path)")
                 return EXIT_SUCCESS
@@ -424,7 +520,7 @@ func runAgent() -> Int32 {
             }
 
         case .remove(let identifier, let profileDirectory, let statePath):
-            let removeResult = removeProfile(withIdentifier: identifier)
+            let removeResult = traced("removeProfile") { removeProfile(withIdentifier: identifier) }
             let fileManager = FileManager.default
 
             if let files = try? fileManager.contentsOfDirectory(at: profileDirectory, includingPropertiesForKeys: nil) {
@@ -449,7 +545,7 @@ func runAgent() -> Int32 {
             }
 
         case .list:
-            if let profiles = listProfiles() {
+            if let profiles = traced("listProfiles", { listProfiles() }) {
                 let jsonData: Data
                 if profiles.isEmpty {
                     jsonData = try JSONSerialization.data(withJSONObject: profiles, options: [.sortedKeys])
@@ -0,0 +1,337 @@
+"""Tests for the spc_client sync and asyncio clients against a live server."""
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from api.main import make_api_server
+from common.models import SystemPolicy
+from common.templates import PolicyTemplate
+from spc_client import ApiError, AsyncClient, Client, RetryPolicy
+
+FAST_RETRY = RetryPolicy(retries=2, backoff=0.001, max_backoff=0.01)
+
+
+class _Server:
+    def __init__(self, app=None) -> None:
+        self.httpd = make_api_server("127.0.0.1", 0, app)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ClientTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = Path(self.temp_dir.name)
+        os.environ["SPC_STATE_PATH"] = str(base / "state.json")
+        os.environ["SPC_PROFILE_DIR"] = str(base / "profiles")
+        os.environ["SPC_TEMPLATE_PATH"] = str(base / "templates.json")
+        os.environ["SPC_AGENT_PATH"] = str(base / "missing-agent")
+        os.environ["SPC_API_QUIET"] = "1"
+        self.server = _Server()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        self.temp_dir.cleanup()
+        for name in ("SPC_STATE_PATH", "SPC_PROFILE_DIR", "SPC_TEMPLATE_PATH", "SPC_AGENT_PATH", "SPC_API_QUIET"):
+            os.environ.pop(name, None)
+
+    def test_sync_client_reuses_connections(self) -> None:
+        with Client(self.server.url, retry=FAST_RETRY) as client:
+            for _ in range(20):
+                self.assertEqual(client.health(), "ok")
+            self.assertEqual(client.connections_opened, 1)
+
+    def test_sync_client_typed_results_and_errors(self) -> None:
+        with Client(self.server.url, retry=FAST_RETRY) as client:
+            template = client.put_template(PolicyTemplate("base", fields={"organization": "Acme"}))
+            self.assertIsInstance(template, PolicyTemplate)
+            self.assertEqual([t.name for t in client.list_templates()], ["base"])
+            policies = client.resolve_template("base", ["com.acme.a", "com.acme.b"])
+            self.assertEqual([p.profile_identifier for p in policies], ["com.acme.a", "com.acme.b"])
+            self.assertEqual(policies[0].organization, "Acme")
+
+            with self.assertRaises(ApiError) as ctx:
+                client.get_policy()
+            self.assertEqual(ctx.exception.status, 404)
+            self.assertEqual(ctx.exception.payload["error"], "policy_not_found")
+
+    def test_sync_fan_out_returns_errors_in_place(self) -> None:
+        with Client(self.server.url, retry=FAST_RETRY) as client:
+            client.put_template(PolicyTemplate("base"))
+            names = ["base", "missing", "base"]
+            results = client.map(lambda name: client.get_template(name).name, names, concurrency=3)
+        self.assertEqual(results[0], "base")
+        self.assertIsInstance(results[1], ApiError)
+        self.assertEqual(results[2], "base")
+
+    def test_async_client_pipelines_over_bounded_pool(self) -> None:
+        async def scenario():
+            async with AsyncClient(self.server.url, pool_size=4, retry=FAST_RETRY) as client:
+                await client.put_template(PolicyTemplate("base", fields={"display_name": "Fleet"}))
+                results = await client.map(
+                    lambda i: client.resolve_template("base", [f"com.fleet.{i}"]), range(50), concurrency=16
+                )
+                return results, client.connections_opened
+
+        results, opened = asyncio.run(scenario())
+        self.assertEqual([r[0].profile_identifier for r in results], [f"com.fleet.{i}" for i in range(50)])
+        self.assertLessEqual(opened, 4)
+
+    def test_async_client_raises_api_errors(self) -> None:
+        async def scenario():
+            async with AsyncClient(self.server.url, retry=FAST_RETRY) as client:
+                return await client.get_template("missing")
+
+        with self.assertRaises(ApiError) as ctx:
+            asyncio.run(scenario())
+        self.assertEqual(ctx.exception.status, 404)
+
+
+# Writes the state file in place, in two chunks, like a non-atomic agent.
+FAKE_AGENT = """#!{python}
+import json, sys, time
+args = dict(zip(sys.argv[2::2], sys.argv[3::2]))
+policy = {{"profile_identifier": args["--profile-identifier"], "display_name": args["--display-name"],
+          "organization": args["--organization"]}}
+state = json.dumps({{"policy": policy, "profile_path": "/tmp/p", "applied_at": "2024-01-01T00:00:00+00:00"}})
+with open(args["--state-path"], "w") as handle:
+    handle.write(state[:20])
+    handle.flush()
+    time.sleep(0.01)
+    handle.write(state[20:])
+"""
+
+
+class ConcurrentApplyTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = Path(self.temp_dir.name)
+        agent = base / "agent"
+        agent.write_text(FAKE_AGENT.format(python=sys.executable))
+        agent.chmod(0o755)
+        os.environ["SPC_STATE_PATH"] = str(base / "state.json")
+        os.environ["SPC_PROFILE_DIR"] = str(base / "profiles")
+        os.environ["SPC_AGENT_PATH"] = str(agent)
+        os.environ["SPC_API_QUIET"] = "1"
+        self.server = _Server()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        self.temp_dir.cleanup()
+        for name in ("SPC_STATE_PATH", "SPC_PROFILE_DIR", "SPC_AGENT_PATH", "SPC_API_QUIET"):
+            os.environ.pop(name, None)
+
+    def test_concurrent_applies_each_see_their_own_state(self) -> None:
+        policies = [SystemPolicy(profile_identifier=f"com.fleet.{i}") for i in range(24)]
+        with Client(self.server.url, retry=RetryPolicy(retries=0)) as client:
+            results = client.apply_policies(policies, install=False, concurrency=8)
+        self.assertEqual(
+            [result.policy.profile_identifier for result in results],
+            [policy.profile_identifier for policy in policies],
+        )
+
+
+class PlainTextErrorTests(unittest.TestCase):
+    def setUp(self) -> None:
+        os.environ["SPC_API_QUIET"] = "1"
+
+        def app(environ, start_response):
+            if environ["PATH_INFO"] == "/templates/broken":
+                body = b"A server error occurred.  Please contact the administrator."
+                headers = [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))]
+                start_response("500 Internal Server Error", headers)
+                return [body]
+            body = json.dumps({"name": "ok", "parent": None, "fields": {}}).encode()
+            start_response("200 OK", [("Content-Length", str(len(body)))])
+            return [body]
+
+        self.server = _Server(app)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        os.environ.pop("SPC_API_QUIET", None)
+
+    def test_non_json_error_pages_are_returned_in_place(self) -> None:
+        with Client(self.server.url, retry=FAST_RETRY) as client:
+            results = client.map(client.get_template, ["ok", "broken", "ok"], concurrency=3)
+        self.assertEqual(results[0].name, "ok")
+        self.assertIsInstance(results[1], ApiError)
+        self.assertEqual(results[1].status, 500)
+        self.assertIn("server error", results[1].payload)
+        self.assertEqual(results[2].name, "ok")
+
+        async def scenario():
+            async with AsyncClient(self.server.url, retry=FAST_RETRY) as client:
+                return await client.map(client.get_template, ["broken", "ok"])
+
+        results = asyncio.run(scenario())
+        self.assertIsInstance(results[0], ApiError)
+        self.assertEqual(results[1].name, "ok")
+
+
+class _OneShotServer:
+    """Answers one keep-alive request per connection, then drops it."""
+
+    def __init__(self) -> None:
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+        self.requests = 0
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                if conn.recv(65536):
+                    self.requests += 1
+                    body = b'{"status": "ok"}'
+                    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+
+    def stop(self) -> None:
+        self.sock.close()
+
+
+class ConnectionReuseTests(unittest.TestCase):
+    def setUp(self) -> None:
+        os.environ["SPC_API_QUIET"] = "1"
+        self.posts = 0
+
+        def slow_post(environ, start_response):
+            if environ["REQUEST_METHOD"] == "POST":
+                self.posts += 1
+                time.sleep(0.3)
+            body = json.dumps({"status": "ok"}).encode()
+            start_response("200 OK", [("Content-Length", str(len(body)))])
+            return [body]
+
+        self.server = _Server(slow_post)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        os.environ.pop("SPC_API_QUIET", None)
+
+    def test_stale_pooled_connection_is_retried_for_free(self) -> None:
+        server = _OneShotServer()
+        try:
+            with Client(server.url, retry=RetryPolicy(retries=0)) as client:
+                self.assertEqual(client.health(), "ok")
+                time.sleep(0.05)
+                self.assertEqual(client.health(), "ok")
+                self.assertEqual(client.connections_opened, 2)
+
+            async def scenario():
+                async with AsyncClient(server.url, retry=RetryPolicy(retries=0)) as client:
+                    await client.health()
+                    await asyncio.sleep(0.05)
+                    return await client.health(), client.connections_opened
+
+            self.assertEqual(asyncio.run(scenario()), ("ok", 2))
+        finally:
+            server.stop()
+        self.assertEqual(server.requests, 4)
+
+    def test_timed_out_post_is_not_resent(self) -> None:
+        policy = SystemPolicy(profile_identifier="com.slow")
+        with Client(self.server.url, timeout=0.1, retry=FAST_RETRY) as client:
+            client.health()
+            with self.assertRaises(TimeoutError):
+                client.create_policy(policy)
+
+        async def scenario():
+            async with AsyncClient(self.server.url, timeout=0.1, retry=FAST_RETRY) as client:
+                await client.health()
+                await client.create_policy(policy)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(scenario())
+        time.sleep(0.4)
+        self.assertEqual(self.posts, 2)
+
+
+class QueuedRequestTests(unittest.TestCase):
+    def setUp(self) -> None:
+        os.environ["SPC_API_QUIET"] = "1"
+        self.handled = 0
+        serial = threading.Lock()
+
+        def one_at_a_time(environ, start_response):
+            with serial:
+                time.sleep(0.1)
+                self.handled += 1
+            body = json.dumps({"status": "ok"}).encode()
+            start_response("200 OK", [("Content-Length", str(len(body)))])
+            return [body]
+
+        self.server = _Server(one_at_a_time)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        os.environ.pop("SPC_API_QUIET", None)
+
+    def test_async_timeout_excludes_waiting_for_a_connection(self) -> None:
+        async def scenario():
+            async with AsyncClient(self.server.url, pool_size=2, timeout=0.35, retry=RetryPolicy(retries=0)) as client:
+                return await client.map(lambda _: client.health(), range(10), concurrency=10)
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results, ["ok"] * 10)
+        self.assertEqual(self.handled, 10)
+
+
+class RetryTests(unittest.TestCase):
+    def setUp(self) -> None:
+        os.environ["SPC_API_QUIET"] = "1"
+        self.calls = 0
+
+        def flaky(environ, start_response):
+            self.calls += 1
+            if self.calls < 3:
+                body = json.dumps({"error": "busy"}).encode()
+                status = "429 Too Many Requests" if self.calls == 1 else "503 Service Unavailable"
+                start_response(status, [("Content-Length", str(len(body))), ("Retry-After", "0")])
+                return [body]
+            body = json.dumps({"status": "ok"}).encode()
+            start_response("200 OK", [("Content-Length", str(len(body)))])
+            return [body]
+
+        self.server = _Server(flaky)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        os.environ.pop("SPC_API_QUIET", None)
+
+    def test_sync_retries_429_and_503(self) -> None:
+        with Client(self.server.url, retry=FAST_RETRY) as client:
+            self.assertEqual(client.health(), "ok")
+        self.assertEqual(self.calls, 3)
+
+    def test_async_gives_up_after_retries(self) -> None:
+        async def scenario():
+            async with AsyncClient(self.server.url, retry=RetryPolicy(retries=1, backoff=0.001)) as client:
+                return await client.health()
+
+        with self.assertRaises(ApiError) as ctx:
+            asyncio.run(scenario())
+        self.assertEqual(ctx.exception.status, 503)
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
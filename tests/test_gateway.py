@@ -0,0 +1,298 @@
+"""Tests for the multi-host gateway against several local API instances."""
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+from pathlib import Path
+from typing import Optional
+
+from api.gateway import Gateway, load_inventory, parse_inventory
+from api.main import make_api_server
+from common.models import PolicyState, SystemPolicy
+from common.state import PolicyStateStore
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str, deadline: float = 10.0) -> None:
+    stop = time.monotonic() + deadline
+    while True:
+        try:
+            urllib.request.urlopen(f"{url}/healthz", timeout=1).read()
+            return
+        except OSError:
+            if time.monotonic() > stop:
+                raise
+            time.sleep(0.05)
+
+
+class GatewayTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        base = Path(cls.temp_dir.name)
+        cls.processes = []
+        cls.hosts = {}
+        for name, enable_assessment in (("mac-a", True), ("mac-b", False), ("mac-c", None)):
+            state_path = base / name / "state.json"
+            if enable_assessment is not None:
+                policy = SystemPolicy(profile_identifier=f"com.{name}", enable_assessment=enable_assessment)
+                PolicyStateStore(state_path).save(PolicyState(policy=policy, profile_path=f"/tmp/{name}"))
+            port = _free_port()
+            env = dict(
+                os.environ,
+                PYTHONPATH=str(SRC),
+                SPC_API_PORT=str(port),
+                SPC_API_QUIET="1",
+                SPC_STATE_PATH=str(state_path),
+                SPC_PROFILE_DIR=str(base / name / "profiles"),
+                SPC_AGENT_PATH=str(base / "missing-agent"),
+            )
+            process = subprocess.Popen(
+                [sys.executable, "-m", "api.main"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            cls.processes.append(process)
+            cls.hosts[name] = f"http://127.0.0.1:{port}"
+        for url in cls.hosts.values():
+            _wait_until_up(url)
+
+        def slow(environ, start_response):
+            time.sleep(1.0)
+            start_response("200 OK", [("Content-Length", "2")])
+            return [b"{}"]
+
+        os.environ["SPC_API_QUIET"] = "1"
+        cls.slow_server = make_api_server("127.0.0.1", 0, slow)
+        threading.Thread(target=cls.slow_server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        for process in cls.processes:
+            process.terminate()
+            process.wait(timeout=10)
+        cls.slow_server.shutdown()
+        cls.slow_server.server_close()
+        os.environ.pop("SPC_API_QUIET", None)
+        cls.temp_dir.cleanup()
+
+    def setUp(self) -> None:
+        hosts = dict(self.hosts)
+        hosts["mac-down"] = f"http://127.0.0.1:{_free_port()}"
+        hosts["mac-slow"] = f"http://127.0.0.1:{self.slow_server.server_port}"
+        self.gateway = Gateway(hosts, timeout=0.5, cache_ttl=60)
+
+    def tearDown(self) -> None:
+        self.gateway.close()
+
+    def _call(self, method: str, path: str, body: Optional[dict] = None) -> tuple[str, dict]:
+        raw = json.dumps(body).encode() if body is not None else b""
+        path, _, query = path.partition("?")
+        response = []
+        environ = {
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "REQUEST_METHOD": method,
+            "CONTENT_LENGTH": str(len(raw)),
+            "wsgi.input": io.BytesIO(raw),
+        }
+        data = b"".join(self.gateway(environ, lambda status, headers: response.append(status)))
+        return response[0], json.loads(data)
+
+    def test_fleet_policy_returns_partial_results_with_host_errors(self) -> None:
+        started = time.monotonic()
+        status, body = self._call("GET", "/fleet/policy")
+        self.assertLess(time.monotonic() - started, 1.0)
+
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(sorted(body["results"]), ["mac-a", "mac-b"])
+        self.assertTrue(body["results"]["mac-a"]["policy"]["enable_assessment"])
+        self.assertFalse(body["results"]["mac-b"]["policy"]["enable_assessment"])
+        self.assertEqual(body["errors"]["mac-c"], {"error": "policy_not_found", "status": 404})
+        self.assertEqual(body["errors"]["mac-down"]["error"], "unreachable")
+        self.assertEqual(body["errors"]["mac-slow"], {"error": "timeout"})
+
+    def test_host_selection_and_unknown_hosts(self) -> None:
+        status, body = self._call("GET", "/fleet/policy?hosts=mac-a,nope")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(list(body["results"]), ["mac-a"])
+        self.assertEqual(body["errors"], {"nope": {"error": "unknown_host"}})
+
+        status, body = self._call("GET", "/fleet/policy?hosts=mac-c")
+        self.assertEqual(status, "502 Bad Gateway")
+
+    def test_aggregated_reads_are_cached_until_a_write(self) -> None:
+        _, first = self._call("GET", "/fleet/policy?hosts=mac-a,mac-b")
+        _, second = self._call("GET", "/fleet/policy?hosts=mac-a,mac-b")
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(first["results"], second["results"])
+
+        status, body = self._call(
+            "POST", "/fleet/policy", {"profile_identifier": "com.fleet", "install": False, "hosts": ["mac-a"]}
+        )
+        self.assertEqual(status, "502 Bad Gateway")
+        self.assertEqual(body["errors"]["mac-a"], {"error": "agent_binary_missing", "status": 503})
+
+        _, third = self._call("GET", "/fleet/policy?hosts=mac-a,mac-b")
+        self.assertFalse(third["cached"])
+
+    def test_write_rejects_malformed_hosts(self) -> None:
+        for hosts in ("mac-a", ["mac-a", 1], {"mac-a": True}):
+            status, body = self._call("POST", "/fleet/policy", {"profile_identifier": "com.fleet", "hosts": hosts})
+            self.assertEqual(status, "400 Bad Request")
+            self.assertEqual(body["error"], "invalid_hosts")
+
+        status, body = self._call("PUT", "/fleet/policy", ["mac-a"])
+        self.assertEqual(status, "400 Bad Request")
+        self.assertEqual(body["error"], "invalid_policy")
+
+    def test_fleet_policies_passes_query_through(self) -> None:
+        status, body = self._call("GET", "/fleet/policies?hosts=mac-a,mac-b&limit=5")
+        self.assertEqual(status, "502 Bad Gateway")
+        self.assertEqual(body["errors"]["mac-a"], {"error": "agent_binary_missing", "status": 503})
+
+        status, body = self._call("GET", "/fleet/policies?hosts=mac-a&limit=0")
+        self.assertEqual(body["errors"]["mac-a"]["status"], 503)
+
+    def test_gateway_served_over_http(self) -> None:
+        server = make_api_server("127.0.0.1", 0, self.gateway)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/fleet/policy?hosts=mac-a,mac-b"
+            body = json.loads(urllib.request.urlopen(url, timeout=5).read())
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(sorted(body["results"]), ["mac-a", "mac-b"])
+
+
+class GatewaySchedulingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        os.environ["SPC_API_QUIET"] = "1"
+        self.calls = 0
+        self.delay = 0.3
+
+        def app(environ, start_response):
+            self.calls += 1
+            time.sleep(self.delay)
+            body = json.dumps({"policies": [], "next_cursor": None}).encode()
+            start_response("200 OK", [("Content-Length", str(len(body)))])
+            return [body]
+
+        self.server = make_api_server("127.0.0.1", 0, app)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        os.environ.pop("SPC_API_QUIET", None)
+
+    def test_queued_hosts_are_not_reported_as_timeouts(self) -> None:
+        gateway = Gateway({f"mac-{i}": self.url for i in range(6)}, timeout=0.5, concurrency=2)
+        try:
+            payload = gateway.fan_out(lambda client: client.list_policies_page())
+        finally:
+            gateway.close()
+        self.assertEqual(payload["errors"], {})
+        self.assertEqual(len(payload["results"]), 6)
+
+    def test_timed_out_writes_are_reported_as_unknown(self) -> None:
+        self.delay = 1.0
+        gateway = Gateway({"mac-a": self.url}, timeout=0.3)
+        try:
+            payload = gateway.fan_out(lambda client: client.create_policy(SystemPolicy("com.x")), write=True)
+            self.assertEqual(payload["errors"]["mac-a"]["error"], "unknown")
+            payload = gateway.fan_out(lambda client: client.list_policies_page())
+            self.assertEqual(payload["errors"]["mac-a"], {"error": "timeout"})
+        finally:
+            gateway.close()
+
+    def test_trickling_host_is_cut_off_at_the_deadline(self) -> None:
+        def trickle(environ, start_response):
+            start_response("200 OK", [("Content-Length", "12")])
+            for _ in range(10):
+                time.sleep(0.2)
+                yield b" "
+            yield b"{}"
+
+        server = make_api_server("127.0.0.1", 0, trickle)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        gateway = Gateway({"mac-a": f"http://127.0.0.1:{server.server_port}"}, timeout=0.5)
+        try:
+            started = time.monotonic()
+            payload = gateway.fan_out(lambda client: client.list_policies_page())
+            elapsed = time.monotonic() - started
+        finally:
+            gateway.close()
+            server.shutdown()
+            server.server_close()
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(payload["errors"], {"mac-a": {"error": "timeout"}})
+
+    def test_concurrent_misses_share_one_fan_out(self) -> None:
+        gateway = Gateway({"mac-a": self.url}, timeout=5, cache_ttl=60)
+        payloads = []
+
+        def read():
+            payloads.append(gateway.cached_fan_out(("policies",), lambda client: client.list_policies_page(), None))
+
+        readers = [threading.Thread(target=read) for _ in range(5)]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        gateway.close()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(payloads), 5)
+        self.assertTrue(all(payload["results"]["mac-a"]["policies"] == [] for payload in payloads))
+
+    def test_expired_cache_entries_are_evicted(self) -> None:
+        self.delay = 0
+        gateway = Gateway({"mac-a": self.url}, cache_ttl=0.05)
+        try:
+            for cursor in range(5):
+                gateway.cached_fan_out(("policies", cursor), lambda client: client.list_policies_page(), None)
+            time.sleep(0.1)
+            gateway.cached_fan_out(("policies", "last"), lambda client: client.list_policies_page(), None)
+        finally:
+            gateway.close()
+        self.assertEqual(list(gateway._cache), [("policies", "last")])
+
+
+class InventoryTests(unittest.TestCase):
+    def test_parse_inventory(self) -> None:
+        hosts = parse_inventory("mac-a=http://10.0.0.1:8000, 10.0.0.2:8000\nhttp://10.0.0.3:8000")
+        self.assertEqual(
+            hosts,
+            {
+                "mac-a": "http://10.0.0.1:8000",
+                "10.0.0.2:8000": "10.0.0.2:8000",
+                "10.0.0.3:8000": "http://10.0.0.3:8000",
+            },
+        )
+
+    def test_load_inventory_formats(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "hosts.json"
+            path.write_text(json.dumps({"hosts": [{"name": "mac-a", "url": "http://a:8000"}]}))
+            self.assertEqual(load_inventory(path), {"mac-a": "http://a:8000"})
+            path.write_text(json.dumps({"mac-b": "http://b:8000"}))
+            self.assertEqual(load_inventory(path), {"mac-b": "http://b:8000"})
+
+
+if __name__ == "__main__":
+    unittest.main()
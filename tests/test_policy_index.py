@@ -0,0 +1,104 @@
+"""Tests for the /policies index, pagination, filters and projection."""
+import json
+import unittest
+
+from api.policy_index import PolicyIndex, QueryError, decode_cursor, index_for_output, parse_query
+
+
+def _profile(identifier: str, organization: str, payload_type: str = "com.apple.systempolicy.control") -> dict:
+    return {
+        "PayloadIdentifier": identifier,
+        "PayloadDisplayName": identifier.upper(),
+        "PayloadOrganization": organization,
+        "PayloadType": "Configuration",
+        "PayloadContent": [{"PayloadType": payload_type, "EnableAssessment": True}],
+    }
+
+
+def _profiles() -> list[dict]:
+    profiles = []
+    for i in range(30):
+        organization = "Acme" if i % 3 == 0 else "Other"
+        payload_type = "com.apple.wifi.managed" if i % 5 == 0 else "com.apple.systempolicy.control"
+        profiles.append(_profile(f"com.{organization.lower()}.p{i:02d}", organization, payload_type))
+    return list(reversed(profiles))
+
+
+class PolicyIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = PolicyIndex(_profiles())
+
+    def _collect(self, **query) -> list[str]:
+        identifiers, cursor = [], None
+        while True:
+            page, cursor = self.index.query(cursor=cursor, **query)
+            identifiers.extend(profile["PayloadIdentifier"] for profile in page)
+            if cursor is None:
+                return identifiers
+
+    def test_unfiltered_query_returns_everything_sorted(self) -> None:
+        page, cursor = self.index.query()
+        identifiers = [profile["PayloadIdentifier"] for profile in page]
+        self.assertEqual(identifiers, sorted(identifiers))
+        self.assertEqual(len(identifiers), 30)
+        self.assertIsNone(cursor)
+
+    def test_cursor_pagination_covers_all_results_once(self) -> None:
+        page, cursor = self.index.query(limit=7)
+        self.assertEqual(len(page), 7)
+        self.assertEqual(decode_cursor(cursor)[0], page[-1]["PayloadIdentifier"])
+        self.assertEqual(self._collect(limit=7), self.index.identifiers)
+
+    def test_filters_combine(self) -> None:
+        acme = self._collect(limit=4, organization="Acme")
+        self.assertEqual(acme, [f"com.acme.p{i:02d}" for i in range(0, 30, 3)])
+
+        wifi_acme = self._collect(limit=2, organization="Acme", payload_type="com.apple.wifi.managed")
+        self.assertEqual(wifi_acme, ["com.acme.p00", "com.acme.p15"])
+
+        self.assertEqual(
+            self._collect(limit=3, prefix="com.other.p1"),
+            [f"com.other.p{i}" for i in (10, 11, 13, 14, 16, 17, 19)],
+        )
+        self.assertEqual(self._collect(prefix="com.acme", payload_type="Configuration", limit=100), acme)
+        self.assertEqual(self._collect(organization="Nobody"), [])
+
+    def test_duplicate_and_missing_identifiers_are_not_skipped(self) -> None:
+        unnamed = [{"PayloadDisplayName": name} for name in ("first", "second", "third")]
+        duplicated = [_profile("com.acme.dup", "Acme"), _profile("com.acme.dup", "Other")]
+        self.index = PolicyIndex(unnamed + duplicated)
+
+        for limit in (1, 2):
+            names, cursor = [], None
+            while True:
+                page, cursor = self.index.query(limit=limit, cursor=cursor)
+                names.extend(profile["PayloadDisplayName"] for profile in page)
+                if cursor is None:
+                    break
+                self.assertTrue(cursor)
+            self.assertEqual(names, ["first", "second", "third", "COM.ACME.DUP", "COM.ACME.DUP"])
+
+    def test_projection_limits_keys(self) -> None:
+        page, _ = self.index.query(limit=2, fields=["PayloadIdentifier", "PayloadOrganization", "Missing"])
+        self.assertEqual(page[0], {"PayloadIdentifier": "com.acme.p00", "PayloadOrganization": "Acme"})
+
+    def test_parse_query(self) -> None:
+        query = parse_query("limit=10&prefix=com.acme&fields=PayloadIdentifier,PayloadDisplayName&organization=Acme")
+        self.assertEqual(query["limit"], 10)
+        self.assertEqual(query["prefix"], "com.acme")
+        self.assertEqual(query["fields"], ["PayloadIdentifier", "PayloadDisplayName"])
+        self.assertIsNone(query["payload_type"])
+        for bad in ("limit=0", "limit=abc", "limit=100000", "cursor=%%%", "cursor=YWJj"):
+            with self.assertRaises(QueryError):
+                parse_query(bad)
+
+    def test_index_is_reused_for_identical_output(self) -> None:
+        stdout = json.dumps(_profiles())
+        first = index_for_output(stdout)
+        self.assertIs(index_for_output(stdout), first)
+        self.assertIsNot(index_for_output(json.dumps(_profiles()[:3])), first)
+        self.assertEqual(len(index_for_output("not json")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
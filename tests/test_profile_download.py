@@ -0,0 +1,184 @@
+"""Tests for the .mobileconfig download endpoints."""
+import os
+import tempfile
+import threading
+import unittest
+import urllib.request
+import uuid
+from email.utils import formatdate
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+from wsgiref.util import FileWrapper
+
+from api.main import application, make_api_server
+from common.models import PolicyState, SystemPolicy
+from common.state import PolicyStateStore
+
+
+class ProfileDownloadTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = Path(self.temp_dir.name)
+        self.state_path = base / "state.json"
+        self.profile_dir = base / "profiles"
+        self.profile_dir.mkdir()
+        os.environ["SPC_STATE_PATH"] = str(self.state_path)
+        os.environ["SPC_PROFILE_DIR"] = str(self.profile_dir)
+
+        self.content = b"<?xml version=\"1.0\"?>\n<plist>" + b"x" * 200_000 + b"</plist>\n"
+        self.profile_path = self._write_profile("com.test.download", self.content)
+        policy = SystemPolicy(profile_identifier="com.test.download")
+        PolicyStateStore(self.state_path).save(PolicyState(policy=policy, profile_path=str(self.profile_path)))
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        os.environ.pop("SPC_STATE_PATH", None)
+        os.environ.pop("SPC_PROFILE_DIR", None)
+
+    def _write_profile(self, identifier: str, content: bytes, mtime: int | None = None) -> Path:
+        path = self.profile_dir / f"{identifier}-{str(uuid.uuid4()).upper()}.mobileconfig"
+        path.write_bytes(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def _get(self, path: str, method: str = "GET", **headers: str) -> tuple[str, dict, bytes, object]:
+        response = []
+
+        def start_response(status, response_headers):
+            response.append((status, dict(response_headers)))
+
+        environ = {
+            "PATH_INFO": path,
+            "REQUEST_METHOD": method,
+            "CONTENT_LENGTH": "0",
+            "wsgi.input": BytesIO(b""),
+        }
+        environ.update({f"HTTP_{name.upper()}": value for name, value in headers.items()})
+        result = application(environ, start_response)
+        try:
+            body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response[0][0], response[0][1], body, result
+
+    def test_serves_current_profile_with_validators(self) -> None:
+        status, headers, body, _ = self._get("/policy/profile")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, self.content)
+        self.assertEqual(headers["Content-Type"], "application/x-apple-aspen-config")
+        self.assertEqual(headers["Content-Length"], str(len(self.content)))
+        self.assertEqual(headers["Accept-Ranges"], "bytes")
+        self.assertIn("ETag", headers)
+        self.assertIn("Last-Modified", headers)
+
+    def test_uses_server_file_wrapper(self) -> None:
+        response = []
+        environ = {
+            "PATH_INFO": "/policy/profile",
+            "REQUEST_METHOD": "GET",
+            "wsgi.input": BytesIO(b""),
+            "wsgi.file_wrapper": FileWrapper,
+        }
+        result = application(environ, lambda status, headers: response.append(status))
+        self.assertIsInstance(result, FileWrapper)
+        self.assertEqual(b"".join(result), self.content)
+        result.close()
+
+    def test_server_sends_full_files_with_sendfile(self) -> None:
+        os.environ["SPC_API_QUIET"] = "1"
+        server = make_api_server("127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/policy/profile"
+        try:
+            with mock.patch.object(FileWrapper, "__next__", side_effect=AssertionError("iterated")) as iterated:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    body = response.read()
+                self.assertEqual(body, self.content)
+                self.assertFalse(iterated.called)
+
+                request = urllib.request.Request(url, headers={"Range": "bytes=10-19"})
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    self.assertEqual(response.read(), self.content[10:20])
+        finally:
+            server.shutdown()
+            server.server_close()
+            os.environ.pop("SPC_API_QUIET", None)
+
+    def test_range_requests(self) -> None:
+        size = len(self.content)
+        status, headers, body, _ = self._get("/policy/profile", range="bytes=0-9")
+        self.assertEqual(status, "206 Partial Content")
+        self.assertEqual(body, self.content[:10])
+        self.assertEqual(headers["Content-Range"], f"bytes 0-9/{size}")
+        self.assertEqual(headers["Content-Length"], "10")
+
+        status, headers, body, _ = self._get("/policy/profile", range="bytes=-5")
+        self.assertEqual(body, self.content[-5:])
+        self.assertEqual(headers["Content-Range"], f"bytes {size - 5}-{size - 1}/{size}")
+
+        status, headers, body, _ = self._get("/policy/profile", range="bytes=100000-")
+        self.assertEqual(body, self.content[100000:])
+
+        status, headers, body, _ = self._get("/policy/profile", range=f"bytes={size}-")
+        self.assertEqual(status, "416 Requested Range Not Satisfiable")
+        self.assertEqual(headers["Content-Range"], f"bytes */{size}")
+
+        status, _, body, _ = self._get("/policy/profile", range="bytes=0-1,5-6")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, self.content)
+
+    def test_if_range_mismatch_serves_full_file(self) -> None:
+        status, _, body, _ = self._get("/policy/profile", range="bytes=0-9", if_range='"stale"')
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, self.content)
+
+    def test_conditional_requests(self) -> None:
+        _, headers, _, _ = self._get("/policy/profile")
+        status, _, body, _ = self._get("/policy/profile", if_none_match=headers["ETag"])
+        self.assertEqual(status, "304 Not Modified")
+        self.assertEqual(body, b"")
+
+        status, _, _, _ = self._get("/policy/profile", if_none_match='"other"')
+        self.assertEqual(status, "200 OK")
+
+        status, _, _, _ = self._get("/policy/profile", if_modified_since=headers["Last-Modified"])
+        self.assertEqual(status, "304 Not Modified")
+        status, _, _, _ = self._get("/policy/profile", if_modified_since=formatdate(0, usegmt=True))
+        self.assertEqual(status, "200 OK")
+
+    def test_head_returns_headers_only(self) -> None:
+        status, headers, body, _ = self._get("/policy/profile", method="HEAD")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, b"")
+        self.assertEqual(headers["Content-Length"], str(len(self.content)))
+
+    def test_per_identifier_serves_newest_profile(self) -> None:
+        self._write_profile("com.test.other", b"old", mtime=1_000_000)
+        self._write_profile("com.test.other", b"new", mtime=2_000_000)
+        self._write_profile("com.test.other.extra", b"unrelated", mtime=3_000_000)
+
+        status, _, body, _ = self._get("/policy/profile/com.test.other")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, b"new")
+
+        status, _, body, _ = self._get("/policy/profile/com.test.download")
+        self.assertEqual(body, self.content)
+
+    def test_missing_profiles_and_methods(self) -> None:
+        status, _, _, _ = self._get("/policy/profile/com.test.missing")
+        self.assertEqual(status, "404 Not Found")
+        status, _, _, _ = self._get("/policy/profile/../state.json")
+        self.assertEqual(status, "404 Not Found")
+        status, _, _, _ = self._get("/policy/profile", method="POST")
+        self.assertEqual(status, "405 Method Not Allowed")
+
+        self.profile_path.unlink()
+        status, _, _, _ = self._get("/policy/profile")
+        self.assertEqual(status, "404 Not Found")
+
+
+if __name__ == "__main__":
+    unittest.main()
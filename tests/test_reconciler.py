@@ -0,0 +1,249 @@
+"""Tests for the drift reconciler."""
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+import api.reconciler as reconciler_module
+from api.main import build_reconciler
+from api.reconciler import Reconciler, policy_fingerprint, profile_fingerprint
+from common.models import PolicyState, SystemPolicy
+from common.state import PolicyStateStore
+
+
+def _installed(policy: SystemPolicy) -> dict:
+    """Mirror the profile dictionary the agent generates for ``policy``."""
+    content = {
+        "EnableAssessment": policy.enable_assessment,
+        "EnableXProtectMalwareUpload": policy.enable_xprotect_malware_upload,
+        "PayloadType": "com.apple.systempolicy.control",
+        "PayloadVersion": 1,
+        "PayloadIdentifier": f"{policy.profile_identifier}.payload",
+        "PayloadUUID": str(uuid.uuid4()),
+    }
+    if policy.enable_assessment:
+        content["AllowIdentifiedDevelopers"] = policy.allow_identified_developers
+    return {
+        "PayloadContent": [content],
+        "PayloadDescription": policy.description or "Generated by SystemPolicyAgent.",
+        "PayloadDisplayName": policy.display_name,
+        "PayloadIdentifier": policy.profile_identifier,
+        "PayloadOrganization": policy.organization,
+        "PayloadRemovalDisallowed": True,
+        "PayloadType": "Configuration",
+        "PayloadUUID": str(uuid.uuid4()),
+        "PayloadVersion": 1,
+    }
+
+
+class FakeHost:
+    def __init__(self, desired: dict[str, SystemPolicy]) -> None:
+        self.desired = desired
+        self.installed = {identifier: _installed(policy) for identifier, policy in desired.items()}
+        self.reapplied: list[str] = []
+        self.fail_reapply = False
+        self.fail_list = False
+
+    def list_profiles(self) -> list[dict]:
+        if self.fail_list:
+            raise RuntimeError("agent list failed")
+        return list(self.installed.values())
+
+    def reapply(self, policy: SystemPolicy) -> bool:
+        self.reapplied.append(policy.profile_identifier)
+        if self.fail_reapply:
+            return False
+        self.installed[policy.profile_identifier] = _installed(policy)
+        return True
+
+
+class ReconcilerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        desired = {
+            f"com.example.{i}": SystemPolicy(profile_identifier=f"com.example.{i}", organization="Example")
+            for i in range(50)
+        }
+        self.host = FakeHost(desired)
+
+    def _reconciler(self, **kwargs) -> Reconciler:
+        kwargs.setdefault("jitter", 0.0)
+        return Reconciler(
+            self.host.list_profiles,
+            self.host.reapply,
+            lambda: self.host.desired,
+            clock=lambda: self.now,
+            **kwargs,
+        )
+
+    def test_fingerprints_match_for_generated_profile(self) -> None:
+        policy = SystemPolicy(profile_identifier="com.example.x", enable_assessment=False, description="d")
+        self.assertEqual(policy_fingerprint(policy), profile_fingerprint(_installed(policy)))
+        drifted = _installed(policy)
+        drifted["PayloadContent"][0]["EnableXProtectMalwareUpload"] = False
+        self.assertNotEqual(policy_fingerprint(policy), profile_fingerprint(drifted))
+
+    def test_in_sync_host_reapplies_nothing(self) -> None:
+        reconciler = self._reconciler()
+        self.assertEqual(reconciler.run_once(), [])
+        self.assertEqual(self.host.reapplied, [])
+        self.assertEqual(reconciler.stats.cycles, 1)
+
+    def test_only_drifted_profiles_are_reapplied(self) -> None:
+        reconciler = self._reconciler()
+        reconciler.run_once()
+        self.host.installed["com.example.3"]["PayloadOrganization"] = "Tampered"
+        self.host.installed["com.example.3"]["PayloadUUID"] = str(uuid.uuid4())
+        del self.host.installed["com.example.7"]
+
+        drifted = reconciler.run_once()
+
+        self.assertEqual(sorted(drifted), ["com.example.3", "com.example.7"])
+        self.assertEqual(sorted(self.host.reapplied), ["com.example.3", "com.example.7"])
+        self.assertEqual(reconciler.stats.drift_detected, 2)
+        self.assertEqual(reconciler.stats.reapplied, 2)
+        self.assertEqual(reconciler.run_once(), [])
+
+    def test_unchanged_profiles_are_not_refingerprinted(self) -> None:
+        reconciler = self._reconciler()
+        reconciler.run_once()
+        calls = []
+        original = reconciler_module.profile_fingerprint
+        reconciler_module.profile_fingerprint = lambda profile: calls.append(profile) or original(profile)
+        try:
+            self.host.installed["com.example.1"] = _installed(self.host.desired["com.example.1"])
+            reconciler.run_once()
+        finally:
+            reconciler_module.profile_fingerprint = original
+        self.assertEqual(len(calls), 1)
+
+    def test_reapplies_are_rate_limited(self) -> None:
+        reconciler = self._reconciler(max_reapply_per_second=1.0, reapply_burst=3)
+        self.host.installed.clear()
+
+        self.assertEqual(len(reconciler.run_once()), 50)
+        self.assertEqual(len(self.host.reapplied), 3)
+        self.assertEqual(reconciler.stats.rate_limited, 47)
+
+        self.now += 2.0
+        reconciler.run_once()
+        self.assertEqual(len(self.host.reapplied), 5)
+
+    def test_failures_back_off_exponentially(self) -> None:
+        reconciler = self._reconciler(interval=10.0, max_interval=35.0)
+        self.assertEqual(reconciler.next_delay(), 10.0)
+
+        self.host.fail_list = True
+        for expected in (20.0, 35.0):
+            with self.assertRaises(RuntimeError):
+                reconciler.run_once()
+            self.assertEqual(reconciler.next_delay(), expected)
+        self.assertEqual(reconciler.stats.list_failures, 2)
+
+        self.host.fail_list = False
+        reconciler.run_once()
+        self.assertEqual(reconciler.next_delay(), 10.0)
+
+    def test_backoff_stays_capped_after_many_failures(self) -> None:
+        reconciler = self._reconciler(interval=60.0, max_interval=900.0)
+        reconciler.stats.consecutive_failures = 5000
+        self.assertEqual(reconciler.next_delay(), 900.0)
+
+    def test_failed_reapply_waits_before_retrying_identifier(self) -> None:
+        reconciler = self._reconciler(interval=10.0)
+        del self.host.installed["com.example.0"]
+        self.host.fail_reapply = True
+
+        reconciler.run_once()
+        reconciler.run_once()
+        self.assertEqual(self.host.reapplied, ["com.example.0"])
+        self.assertEqual(reconciler.stats.reapply_failures, 1)
+
+        self.host.fail_reapply = False
+        self.now += 20.0
+        reconciler.run_once()
+        self.assertEqual(self.host.reapplied, ["com.example.0", "com.example.0"])
+        self.assertEqual(reconciler.run_once(), [])
+
+    def test_jitter_stays_within_bounds(self) -> None:
+        reconciler = self._reconciler(interval=10.0, jitter=0.2)
+        delays = [reconciler.next_delay() for _ in range(100)]
+        self.assertTrue(all(8.0 <= delay <= 12.0 for delay in delays))
+
+
+# Logs each invocation; ``list`` prints whatever LIST_OUTPUT holds.
+FAKE_AGENT = """#!{python}
+import os, sys
+with open(os.environ["AGENT_LOG"], "a") as log:
+    log.write(sys.argv[1] + "\\n")
+if sys.argv[1] == "list":
+    print(os.environ.get("LIST_OUTPUT", "[]"))
+"""
+
+
+class BuildReconcilerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = Path(self.temp_dir.name)
+        agent = base / "agent"
+        agent.write_text(FAKE_AGENT.format(python=sys.executable))
+        agent.chmod(0o755)
+        self.log = base / "agent.log"
+        self.store = PolicyStateStore(base / "state.json")
+        self.policy = SystemPolicy(profile_identifier="com.example.a")
+        self.store.save(PolicyState(policy=self.policy, profile_path=str(base / "a.mobileconfig")))
+        self.env = {
+            "SPC_AGENT_PATH": str(agent),
+            "SPC_STATE_PATH": str(self.store.path),
+            "SPC_PROFILE_DIR": str(base / "profiles"),
+            "AGENT_LOG": str(self.log),
+        }
+        os.environ.update(self.env)
+
+    def tearDown(self) -> None:
+        for name in list(self.env) + ["LIST_OUTPUT"]:
+            os.environ.pop(name, None)
+        self.temp_dir.cleanup()
+
+    def _agent_calls(self) -> list[str]:
+        return self.log.read_text().split() if self.log.exists() else []
+
+    def test_state_changed_during_cycle_is_not_overwritten(self) -> None:
+        replacement = SystemPolicy(profile_identifier="com.example.b", enable_assessment=False)
+        for change in (
+            lambda: self.store.save(PolicyState(policy=replacement, profile_path="/tmp/b")),
+            lambda: self.store.path.unlink(),
+        ):
+            reconciler = build_reconciler()
+            list_profiles = reconciler.list_profiles
+
+            def list_then_change(list_profiles=list_profiles, change=change):
+                profiles = list_profiles()
+                change()  # a PUT or DELETE /policy landing mid-cycle
+                return profiles
+
+            reconciler.list_profiles = list_then_change
+            self.assertEqual(reconciler.run_once(), ["com.example.a"])
+            self.assertEqual(reconciler.stats.reapplied, 0)
+            self.assertEqual(reconciler.stats.reapply_skipped, 1)
+            self.assertNotIn("apply", self._agent_calls())
+            self.store.save(PolicyState(policy=self.policy, profile_path="/tmp/a"))
+
+        self.assertEqual(build_reconciler().run_once(), ["com.example.a"])
+        self.assertIn("apply", self._agent_calls())
+
+    def test_garbled_list_output_backs_off_instead_of_reapplying(self) -> None:
+        for output in ("not json", '{"PayloadIdentifier": "com.example.a"}'):
+            os.environ["LIST_OUTPUT"] = output
+            reconciler = build_reconciler()
+            with self.assertRaises(RuntimeError):
+                reconciler.run_once()
+            self.assertEqual(reconciler.stats.list_failures, 1)
+            self.assertEqual(reconciler.stats.consecutive_failures, 1)
+        self.assertNotIn("apply", self._agent_calls())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+"""Tests for layered policy templates and the template endpoints."""
+import json
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+
+from api.main import application
+from common.templates import PolicyTemplate, TemplateError, TemplateRegistry, TemplateStore
+
+
+def _registry() -> TemplateRegistry:
+    return TemplateRegistry(
+        [
+            PolicyTemplate("global", fields={"enable_xprotect_malware_upload": True, "organization": "Fleet"}),
+            PolicyTemplate("acme", parent="global", fields={"organization": "Acme", "description": "Acme baseline"}),
+            PolicyTemplate("acme-lab", parent="acme", fields={"enable_xprotect_malware_upload": False}),
+            PolicyTemplate("other", parent="global", fields={"organization": "Other"}),
+        ]
+    )
+
+
+class TemplateRegistryTests(unittest.TestCase):
+    def test_resolve_applies_layers_in_order(self) -> None:
+        registry = _registry()
+        registry.set_identifier_overrides("com.acme.kiosk", {"description": "Kiosk"})
+
+        policy = registry.resolve("acme-lab", "com.acme.kiosk")
+
+        self.assertEqual(policy.profile_identifier, "com.acme.kiosk")
+        self.assertEqual(policy.organization, "Acme")
+        self.assertEqual(policy.description, "Kiosk")
+        self.assertFalse(policy.enable_xprotect_malware_upload)
+        self.assertEqual(registry.resolve("acme-lab", "com.acme.other").description, "Acme baseline")
+
+    def test_resolution_is_memoized(self) -> None:
+        registry = _registry()
+        first = registry.resolve_many("acme", [f"com.acme.{i}" for i in range(100)])
+        second = registry.resolve_many("acme", [f"com.acme.{i}" for i in range(100)])
+        self.assertTrue(all(a is b for a, b in zip(first, second)))
+
+    def test_parent_change_invalidates_only_descendants(self) -> None:
+        registry = _registry()
+        lab = registry.resolve("acme-lab", "com.acme.1")
+        other = registry.resolve("other", "com.other.1")
+
+        registry.set_template(PolicyTemplate("acme", parent="global", fields={"organization": "Acme Inc"}))
+
+        self.assertIs(registry.resolve("other", "com.other.1"), other)
+        refreshed = registry.resolve("acme-lab", "com.acme.1")
+        self.assertIsNot(refreshed, lab)
+        self.assertEqual(refreshed.organization, "Acme Inc")
+        self.assertIsNone(refreshed.description)
+
+    def test_identifier_override_invalidates_only_that_identifier(self) -> None:
+        registry = _registry()
+        kept = registry.resolve("acme", "com.acme.1")
+        changed = registry.resolve("acme", "com.acme.2")
+
+        registry.set_identifier_overrides("com.acme.2", {"display_name": "Two"})
+
+        self.assertIs(registry.resolve("acme", "com.acme.1"), kept)
+        self.assertIsNot(registry.resolve("acme", "com.acme.2"), changed)
+        self.assertEqual(registry.resolve("acme", "com.acme.2").display_name, "Two")
+
+    def test_rejects_cycles_unknown_parents_and_fields(self) -> None:
+        registry = _registry()
+        with self.assertRaises(TemplateError):
+            registry.set_template(PolicyTemplate("global", parent="acme-lab"))
+        with self.assertRaises(TemplateError):
+            registry.set_template(PolicyTemplate("orphan", parent="missing"))
+        with self.assertRaises(TemplateError):
+            registry.set_template(PolicyTemplate("bad", fields={"profile_identifier": "x"}))
+        with self.assertRaises(TemplateError):
+            registry.set_template(PolicyTemplate("bad", fields=["organization"]))  # type: ignore[arg-type]
+        with self.assertRaises(TemplateError):
+            registry.set_template(PolicyTemplate("bad", parent=["global"]))  # type: ignore[arg-type]
+        with self.assertRaises(TemplateError):
+            registry.set_identifier_overrides("com.acme.1", ["display_name"])  # type: ignore[arg-type]
+        with self.assertRaises(TemplateError):
+            registry.set_template(PolicyTemplate("bad", fields={"enable_assessment": "no"}))
+        with self.assertRaises(TemplateError):
+            registry.set_identifier_overrides("com.acme.1", {"organization": 5})
+        registry.set_template(PolicyTemplate("ok", fields={"description": None, "enable_assessment": False}))
+        with self.assertRaises(TemplateError):
+            registry.remove_template("acme")
+        self.assertEqual(registry.get("global").parent, None)
+
+    def test_store_round_trips_and_reloads_on_change(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "templates.json"
+            store = TemplateStore(path)
+            store.registry.sync(_registry().templates(), {"com.acme.1": {"display_name": "One"}})
+            store.save()
+            untouched = store.load().resolve("other", "com.other.1")
+
+            reloaded = TemplateStore(path).load()
+            self.assertEqual(reloaded.resolve("acme", "com.acme.1").display_name, "One")
+
+            payload = json.loads(path.read_text())
+            payload["templates"][0]["fields"]["organization"] = "Acme Renamed"
+            path.write_text(json.dumps(payload))
+            os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+
+            registry = store.load()
+            self.assertEqual(registry.resolve("acme", "com.acme.1").organization, "Acme Renamed")
+            self.assertIs(registry.resolve("other", "com.other.1"), untouched)
+
+
+class TemplateEndpointTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = Path(self.temp_dir.name)
+        os.environ["SPC_STATE_PATH"] = str(base / "state.json")
+        os.environ["SPC_PROFILE_DIR"] = str(base / "profiles")
+        os.environ["SPC_TEMPLATE_PATH"] = str(base / "templates.json")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        for name in ("SPC_STATE_PATH", "SPC_PROFILE_DIR", "SPC_TEMPLATE_PATH"):
+            os.environ.pop(name, None)
+
+    def _call_api(self, method: str, path: str, body: dict | list | None = None) -> tuple[str, dict]:
+        raw = json.dumps(body).encode() if body is not None else b""
+        response = []
+
+        def start_response(status, headers):
+            response.append(status)
+
+        environ = {
+            "PATH_INFO": path,
+            "REQUEST_METHOD": method,
+            "CONTENT_LENGTH": str(len(raw)),
+            "wsgi.input": BytesIO(raw),
+        }
+        body_data = b"".join(application(environ, start_response))
+        return response[0], json.loads(body_data.decode())
+
+    def test_template_crud_and_bulk_resolve(self) -> None:
+        status, _ = self._call_api("PUT", "/templates/global", {"fields": {"organization": "Fleet"}})
+        self.assertEqual(status, "200 OK")
+        status, _ = self._call_api(
+            "PUT", "/templates/acme", {"parent": "global", "fields": {"enable_assessment": False}}
+        )
+        self.assertEqual(status, "200 OK")
+        self._call_api("PUT", "/identifiers/com.acme.2", {"fields": {"display_name": "Two"}})
+
+        status, body = self._call_api("GET", "/templates/acme")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body["resolved_fields"], {"organization": "Fleet", "enable_assessment": False})
+
+        status, body = self._call_api(
+            "POST", "/templates/acme/resolve", {"identifiers": ["com.acme.1", "com.acme.2"]}
+        )
+        self.assertEqual(status, "200 OK")
+        policies = body["policies"]
+        self.assertEqual([p["profile_identifier"] for p in policies], ["com.acme.1", "com.acme.2"])
+        self.assertFalse(policies[0]["allow_identified_developers"])
+        self.assertEqual(policies[1]["display_name"], "Two")
+
+        status, body = self._call_api("DELETE", "/templates/global")
+        self.assertEqual(status, "409 Conflict")
+        status, body = self._call_api("GET", "/templates")
+        self.assertEqual([t["name"] for t in body["templates"]], ["acme", "global"])
+
+    def test_invalid_and_unknown_templates(self) -> None:
+        status, body = self._call_api("PUT", "/templates/child", {"parent": "missing"})
+        self.assertEqual(status, "400 Bad Request")
+        self.assertEqual(body["error"], "invalid_template")
+        status, body = self._call_api("POST", "/templates/missing/resolve", {"identifiers": ["a"]})
+        self.assertEqual(status, "404 Not Found")
+        self._call_api("PUT", "/templates/base", {})
+        status, body = self._call_api("POST", "/templates/base/resolve", {"identifiers": "a"})
+        self.assertEqual(status, "400 Bad Request")
+
+    def test_malformed_template_leaves_saved_templates_intact(self) -> None:
+        self._call_api("PUT", "/templates/base", {"fields": {"organization": "Fleet"}})
+        status, body = self._call_api("PUT", "/templates/broken", {"fields": ["organization"]})
+        self.assertEqual(status, "400 Bad Request")
+        self.assertEqual(body["error"], "invalid_template")
+        status, body = self._call_api("PUT", "/identifiers/com.acme.1", {"fields": ["organization"]})
+        self.assertEqual(status, "400 Bad Request")
+
+        status, body = self._call_api("PUT", "/templates/typed", {"fields": {"enable_assessment": "no"}})
+        self.assertEqual((status, body["error"]), ("400 Bad Request", "invalid_template"))
+        status, body = self._call_api("PUT", "/identifiers/com.acme.1", {"fields": {"organization": 5}})
+        self.assertEqual((status, body["error"]), ("400 Bad Request", "invalid_overrides"))
+        for path, error in (
+            ("/templates/listed", "invalid_template"),
+            ("/identifiers/com.acme.1", "invalid_overrides"),
+            ("/templates/base/resolve", "identifiers_required"),
+        ):
+            method = "POST" if path.endswith("resolve") else "PUT"
+            status, body = self._call_api(method, path, ["a"])
+            self.assertEqual((status, body["error"]), ("400 Bad Request", error))
+
+        status, body = self._call_api("GET", "/templates")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual([t["name"] for t in body["templates"]], ["base"])
+        self.assertFalse([name for name in os.listdir(self.temp_dir.name) if name.startswith(".")])
+
+
+if __name__ == "__main__":
+    unittest.main()
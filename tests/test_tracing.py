@@ -0,0 +1,121 @@
+"""Tests for sampled request tracing and trace-event export."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+
+from api import tracing
+from api.main import application
+
+
+class TracingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base = Path(self.temp_dir.name)
+        self.trace_path = base / "traces.json"
+        os.environ["SPC_STATE_PATH"] = str(base / "state.json")
+        os.environ["SPC_PROFILE_DIR"] = str(base / "profiles")
+        os.environ["SPC_TRACE_PATH"] = str(self.trace_path)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+        for name in ("SPC_STATE_PATH", "SPC_PROFILE_DIR", "SPC_TRACE_PATH", "SPC_TRACE_SAMPLE_RATE"):
+            os.environ.pop(name, None)
+
+    def _call_api(self, method: str, path: str) -> str:
+        response = []
+
+        def start_response(status, headers):
+            response.append(status)
+
+        environ = {
+            "PATH_INFO": path,
+            "REQUEST_METHOD": method,
+            "CONTENT_LENGTH": "0",
+            "wsgi.input": BytesIO(b""),
+        }
+        b"".join(application(environ, start_response))
+        return response[0]
+
+    def test_unsampled_requests_write_nothing(self) -> None:
+        os.environ["SPC_TRACE_SAMPLE_RATE"] = "0"
+        self.assertEqual(self._call_api("GET", "/healthz"), "200 OK")
+        self.assertFalse(self.trace_path.exists())
+        self.assertIs(tracing.current(), tracing.NOOP_TRACE)
+
+    def test_sampled_request_exports_nested_spans(self) -> None:
+        os.environ["SPC_TRACE_SAMPLE_RATE"] = "1"
+        self.assertEqual(self._call_api("GET", "/healthz"), "200 OK")
+
+        events = tracing.read_events(self.trace_path)
+        by_name = {event["name"]: event for event in events}
+        self.assertEqual(set(by_name), {"application", "json_response"})
+        root = by_name["application"]
+        child = by_name["json_response"]
+        self.assertEqual(root["ph"], "X")
+        self.assertEqual(root["args"]["status"], "200 OK")
+        self.assertEqual(root["args"]["path"], "/healthz")
+        self.assertEqual(child["args"]["trace_id"], root["args"]["trace_id"])
+        self.assertEqual(child["args"]["parent_id"], root["args"]["span_id"])
+        self.assertGreaterEqual(child["ts"], root["ts"])
+
+    def test_each_sampled_request_gets_its_own_trace_id(self) -> None:
+        os.environ["SPC_TRACE_SAMPLE_RATE"] = "1"
+        self._call_api("GET", "/healthz")
+        self._call_api("GET", "/missing")
+
+        roots = [e for e in tracing.read_events(self.trace_path) if e["name"] == "application"]
+        self.assertEqual(len(roots), 2)
+        self.assertNotEqual(roots[0]["args"]["trace_id"], roots[1]["args"]["trace_id"])
+        self.assertEqual(roots[1]["args"]["status"], "404 Not Found")
+
+    def test_agent_env_propagates_trace_context(self) -> None:
+        tracer = tracing.Tracer(1.0, self.trace_path)
+        trace = tracer.start("application")
+        token = tracing.activate(trace)
+        try:
+            with tracing.span("agent") as span:
+                env = tracing.agent_env()
+        finally:
+            tracing.deactivate(token)
+        trace.finish()
+
+        assert env is not None
+        self.assertEqual(env[tracing.TRACE_ID_ENV], trace.trace_id)
+        self.assertEqual(env[tracing.TRACE_PARENT_ENV], span.span_id)
+        self.assertEqual(env[tracing.TRACE_PATH_ENV], str(self.trace_path))
+
+    def test_read_events_accepts_agent_appended_events(self) -> None:
+        tracer = tracing.Tracer(1.0, self.trace_path)
+        tracer.start("application").finish()
+        with self.trace_path.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps({"name": "writeProfile", "ph": "X", "ts": 1, "dur": 1}) + ",\n")
+
+        names = [event["name"] for event in tracing.read_events(self.trace_path)]
+        self.assertEqual(names, ["application", "writeProfile"])
+
+    def test_concurrent_writers_keep_the_file_valid(self) -> None:
+        # Separate processes, like the API and agents appending to one file.
+        script = (
+            "import sys; from api import tracing\n"
+            "tracer = tracing.Tracer(1.0, sys.argv[1])\n"
+            "for _ in range(50):\n"
+            "    tracer.export([{'name': 'x' * 2000, 'ph': 'X', 'ts': 1, 'dur': 1}] * 5)\n"
+        )
+        env = dict(os.environ, PYTHONPATH=str(Path(tracing.__file__).resolve().parents[1]))
+        writers = [
+            subprocess.Popen([sys.executable, "-c", script, str(self.trace_path)], env=env) for _ in range(4)
+        ]
+        for writer in writers:
+            self.assertEqual(writer.wait(timeout=60), 0)
+
+        self.assertEqual(len(tracing.read_events(self.trace_path)), 4 * 50 * 5)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["traces.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()